@@ -0,0 +1,6 @@
+import asyncio
+import sys
+
+from .runner import main
+
+sys.exit(asyncio.run(main()))
@@ -0,0 +1,167 @@
+'''
+Benchmark cases. Each one is registered with a name and is called once to set up, returning
+(run, ops) where run() performs ops operations.
+'''
+from mmkv_abi.command import Command
+from mmkv_abi.drive_info import DriveInfo
+from mmkv_abi.language_data import LanguageData
+from mmkv_abi.protocol import ABIProtocol
+from mmkv_abi.title_tree import TitleList
+
+from . import synthetic
+
+CASES = {}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+class _Transport:
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def write(self, data):
+        pass
+
+
+class _Session:
+    # TreeNodes only keep a weakref to their MakeMKV
+    pass
+
+
+@case('protocol.decode')
+def protocol_decode():
+    count = 30_000
+    stream = memoryview(synthetic.frame_stream(count))
+
+    protocol = ABIProtocol(lambda cmd, args, data: None, lambda exc: None)
+    protocol.handshake.set_result('A0001')
+
+    def run():
+        # Like a transport, read at most CHUNK_SIZE and no more than the buffer has room for
+        offset = 0
+        while offset < len(stream):
+            buffer = protocol.get_buffer(CHUNK_SIZE)
+            size = min(len(buffer), CHUNK_SIZE, len(stream) - offset)
+            buffer[:size] = stream[offset:offset + size]
+            protocol.buffer_updated(size)
+            offset += size
+
+    return run, count
+
+
+@case('protocol.encode')
+def protocol_encode():
+    count = 10_000
+    protocol = ABIProtocol(lambda cmd, args, data: None, lambda exc: None)
+    protocol.connection_made(_Transport())
+    # Write as MakeMKV does from frame_received, so the loop (which is not running between
+    # rounds) isn't left holding a cancelled flush handle per frame
+    protocol._dispatching = True
+
+    requests = [
+        (Command.CallGetUiItemInfo, (('<Q', 0x1000), ('<I', 2)), b''),
+        (Command.CallGetUiItemState, (('<Q', 0x1000),), b''),
+        (Command.CallSetUiItemState, (('<Q', 0x1000), ('<I', 1)), b''),
+        (Command.CallSetOutputFolder, (), b'/srv/media/rips/MOVIE\x00')
+    ]
+
+    def run():
+        for _ in range(count // len(requests)):
+            for cmd, args, data in requests:
+                protocol.write_frame(cmd, args, data)
+
+            protocol.flush()
+
+    return run, count // len(requests) * len(requests)
+
+
+def _title_tree(titles, tracks, chapters):
+    calls = list(synthetic.title_tree(titles, tracks, chapters))
+    session = _Session()
+
+    def run():
+        title_list = TitleList(titles, session, 1)
+        title = None
+        for kind, args in calls:
+            if kind == 'title':
+                title_list.add_title(*args)
+                title = title_list[args[0]]
+            elif kind == 'track':
+                title.add_track(*args[1:])
+            else:
+                title.add_chapter(*args[1:])
+
+        run.tree = title_list
+
+    return run, len(calls)
+
+
+@case('title_tree.dvd')
+def title_tree_dvd():
+    return _title_tree(titles=40, tracks=12, chapters=30)
+
+
+@case('title_tree.obfuscated_bd')
+def title_tree_obfuscated_bd():
+    # Discs with hundreds of decoy playlists
+    return _title_tree(titles=800, tracks=40, chapters=40)
+
+
+def _drive_update(kind):
+    args, data = synthetic.drive_update(kind)
+
+    def run():
+        DriveInfo.from_update(args, data)
+
+    return run, 1
+
+
+for kind in ('dvd', 'bd', 'uhd'):
+    case(f'drive_info.{kind}')(lambda kind=kind: _drive_update(kind))
+
+
+@case('drive_info.spin_up')
+def drive_info_spin_up():
+    # makemkvcon repeats BackUpdateDrive while a disc spins up, mostly with the same blocks
+    updates = [synthetic.drive_update('bd')] * 8 + [synthetic.drive_update('uhd')] * 8
+    drive_info = DriveInfo()
+
+    def run():
+        for args, data in updates:
+            drive_info.update(args, data)
+
+    return run, len(updates)
+
+
+@case('language_data.construct')
+def language_data_construct():
+    data = synthetic.language_blob()
+
+    def run():
+        LanguageData(data)
+
+    return run, 1
+
+
+@case('language_data.lookup')
+def language_data_lookup():
+    data = synthetic.language_blob()
+    keys = range(1, 7001)
+
+    def run():
+        language_data = LanguageData(data)
+        for key in keys:
+            language_data[key]
+
+    return run, len(keys)
@@ -0,0 +1,78 @@
+'''
+Compares frames/sec of the StreamReader based decoder MakeMKV used to have against ABIProtocol.
+
+    python -m benchmarks.frame_decode [frame count]
+'''
+import asyncio
+import struct
+import sys
+import time
+
+from mmkv_abi.command import Command
+from mmkv_abi.protocol import ABIProtocol
+
+from .synthetic import frame_stream
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def legacy_unpack_received(stream):
+    # The decoder that MakeMKV._unpack_received used before ABIProtocol
+    buffer = await asyncio.wait_for(stream.read(4), 5)
+    data_size, arg_len, cmd = struct.unpack('<HBB', buffer)
+    cmd = Command(cmd)
+
+    args = [struct.unpack('<I', await stream.readexactly(4))[0] for _ in range(arg_len)]
+    data = await asyncio.wait_for(stream.readexactly(data_size), 1)
+
+    return (cmd, args, data)
+
+
+async def bench_legacy(stream, count):
+    reader = asyncio.StreamReader(limit=len(stream) + 1)
+    reader.feed_data(stream)
+    reader.feed_eof()
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await legacy_unpack_received(reader)
+
+    return time.perf_counter() - start
+
+
+async def bench_protocol(stream, count):
+    received = 0
+
+    def frame_received(cmd, args, data):
+        nonlocal received
+        received += 1
+
+    protocol = ABIProtocol(frame_received, lambda exc: None)
+    protocol.handshake.set_result('A0001')
+
+    view = memoryview(stream)
+    start = time.perf_counter()
+    # Like a transport, read at most CHUNK_SIZE and no more than the buffer has room for
+    offset = 0
+    while offset < len(stream):
+        buffer = protocol.get_buffer(CHUNK_SIZE)
+        size = min(len(buffer), CHUNK_SIZE, len(stream) - offset)
+        buffer[:size] = view[offset:offset + size]
+        protocol.buffer_updated(size)
+        offset += size
+
+    elapsed = time.perf_counter() - start
+    assert received == count
+    return elapsed
+
+
+async def main(count):
+    stream = frame_stream(count)
+
+    for name, bench in (('StreamReader', bench_legacy), ('ABIProtocol', bench_protocol)):
+        elapsed = await bench(stream, count)
+        print(f'{name:>14}: {count / elapsed:12,.0f} frames/sec')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -0,0 +1,108 @@
+'''
+Runs the benchmark cases and reports ops/sec and peak memory, optionally saving the results as a
+baseline or comparing them against one.
+
+    python -m benchmarks [-k filter] [--min-time 1] [--save baseline.json] [--compare baseline.json]
+'''
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from .cases import CASES
+
+
+def measure(setup, min_time = 1.0, rounds = 5):
+    '''
+    Returns (ops/sec, peak bytes). The rate is the best of rounds rounds of at least min_time /
+    rounds seconds each and the peak memory is taken from a separate traced run.
+    '''
+    run, ops = setup()
+    run()
+
+    best = 0.0
+    for _ in range(rounds):
+        count = 0
+        gc.collect()
+        start = time.perf_counter()
+        deadline = start + min_time / rounds
+        while True:
+            run()
+            count += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+
+        best = max(best, count * ops / (now - start))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def format_change(current, previous):
+    return f'{(current - previous) / previous * 100:+7.1f}%'
+
+
+async def main(argv = None):
+    # Runs inside a loop since ABIProtocol creates its handshake future in __init__
+    parser = argparse.ArgumentParser(description='Runs the mmkv_abi benchmarks')
+    parser.add_argument('-k', '--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds to time each case for')
+    parser.add_argument('--save', metavar='PATH', help='write the results to PATH as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results against a saved baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='fraction ops/sec may drop by before a case counts as a regression'
+    )
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    names = [name for name in CASES if args.filter in name]
+    width = max(map(len, names), default=0)
+
+    header = f'{"case":<{width}}  {"ops/sec":>14}  {"peak KiB":>10}'
+    print(header + (f'  {"vs baseline":>12}' if baseline else ''))
+
+    results = {}
+    regressions = []
+    for name in names:
+        ops_per_sec, peak = measure(CASES[name], args.min_time)
+        result = results[name] = {'ops_per_sec': ops_per_sec, 'peak_bytes': peak}
+        line = f'{name:<{width}}  {result["ops_per_sec"]:14,.0f}  {result["peak_bytes"] / 1024:10,.1f}'
+
+        previous = baseline.get(name)
+        if previous is not None:
+            line += f'  {format_change(result["ops_per_sec"], previous["ops_per_sec"]):>12}'
+            if result['ops_per_sec'] < previous['ops_per_sec'] * (1 - args.threshold):
+                regressions.append(name)
+                line += '  REGRESSION'
+
+        print(line, flush=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f'{len(regressions)} case(s) regressed by more than {args.threshold:.0%}: {", ".join(regressions)}')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,113 @@
+'''
+Synthetic protocol traffic and payloads shaped like what makemkvcon sends for real discs
+'''
+import struct
+
+from mmkv_abi.command import Command
+from mmkv_abi.drive_info import DriveInfoId
+
+
+def frame(cmd: Command, args = (), data = b''):
+    return struct.pack(f'<HBB{len(args)}I', len(data), len(args), cmd.value, *args) + data
+
+
+def frame_stream(count):
+    '''
+    A title scan worth of frames: title, track and chapter info interleaved with Returns
+    '''
+    frames = []
+    for i in range(count):
+        if i % 3 == 0:
+            frames.append(frame(Command.BackSetTitleInfo, (i, 0x100 + i, 0, 2, 3, 0x200 + i, 0)))
+        elif i % 3 == 1:
+            frames.append(frame(Command.BackSetTrackInfo, (i, 1, 0x1000 + i, 0)))
+        else:
+            frames.append(frame(Command.Return, (0, 1), b'0:42:17\x00'))
+
+    return b''.join(frames)
+
+
+def title_tree(titles, tracks, chapters):
+    '''
+    Yields the (kind, args) BackSetTitleInfo/TrackInfo/ChapterInfo calls for a title collection
+    '''
+    handle = 0x1000
+    for title in range(titles):
+        yield 'title', (title, handle, handle + 1, chapters, tracks)
+        handle += 2
+
+        for track in range(tracks):
+            yield 'track', (title, track, handle)
+            handle += 1
+
+        for chapter in range(chapters):
+            yield 'chapter', (title, chapter, handle)
+            handle += 1
+
+
+def _tlv(cmd_id, data):
+    return struct.pack('>II', cmd_id, len(data)) + data
+
+
+def _timestamp(value):
+    return b'\x00' * 4 + value + b'\x00' * (16 - len(value))
+
+
+def drive_update(kind):
+    '''
+    Returns BackUpdateDrive (args, data) for a drive holding a 'dvd', 'bd' or 'uhd' disc
+    '''
+    inquiry = b'\x05\x80\x00\x32\x5b\x00\x00\x00' + b'HL-DT-ST' + b'BD-RE  WH16NS60 ' + b'1.02'
+    blocks = [
+        _tlv(DriveInfoId.DriveioTag, b'MakeMKV drive tag\x00'),
+        _tlv(DriveInfoId.InquiryData, inquiry + b'\x00' * 60),
+        _tlv(DriveInfoId.FeatureDescriptor_DriveSerialNumber, b'\x01\x08\x03\x10' + b'KZLG1234ABCD'),
+        _tlv(DriveInfoId.FeatureDescriptor_FirmwareInformation, _timestamp(b'20190312101500')),
+        _tlv(DriveInfoId.FirmwareDetailsString, b'LibreDrive compatible firmware'),
+        _tlv(DriveInfoId.DiscCapacity, struct.pack('>II', 24438784, 2048))
+    ]
+
+    if kind == 'dvd':
+        name = b'MOVIE_DVD'
+        blocks += [
+            _tlv(DriveInfoId.CurrentProfile, (0x10).to_bytes(2, 'big')),
+            _tlv(DriveInfoId.DiscStructure_DVD_PhysicalFormat, b'\x00' * 4 + b'\x01\x02\x21\x00' + b'\x00' * 12),
+            _tlv(DriveInfoId.DiscStructure_DVD_CopyrightInformation, b'\x00' * 4 + b'\x01\x00\x00\x00')
+        ]
+        fs_flags = 0
+    else:
+        uhd = kind == 'uhd'
+        name = b'MOVIE_UHD' if uhd else b'MOVIE_BD'
+        disc_info = b'\x00' * 4 + b'DI\x01' + b'\x00' * 5 + b'BDO' + b'\x00' + bytes(((3 if uhd else 2) << 4 | (9 if uhd else 1), 2)) + b'\x00' * 14
+        blocks += [
+            _tlv(DriveInfoId.CurrentProfile, (0x40).to_bytes(2, 'big')),
+            _tlv(DriveInfoId.DiscStructure_BD_DiscInformation, disc_info),
+            _tlv(0x05102201, b'\x10\x00\x00\x00\x00' + bytes((20 if uhd else 10,)) + b'\x00\x00' + (76).to_bytes(4, 'big')),
+            _tlv(0x05102203, b'\x00\x02\x00\x00'),
+            _tlv(0x05102204, (2 if uhd else 1).to_bytes(4, 'big')),
+            _tlv(0x05102205, _timestamp(b'20210805120000')),
+            _tlv(0x05102210, b'LibreDrive\nStatus: Enabled\nDrive platform: MT1959\nHarware support: Yes\x00\x00')
+        ]
+        if uhd:
+            blocks.append(_tlv(0x05102202, b'\x00' * 13 + (2021).to_bytes(2, 'big') + b'\x06\x00'))
+
+        fs_flags = 8 | 16 if uhd else 8
+
+    data = b'BD-RE HL-DT-ST BD-RE WH16NS60 1.02\x00' + name + b'\x00' + b'/dev/sr0\x00' + b''.join(blocks)
+    return (0, 7, 2, fs_flags), data
+
+
+def language_blob(count = 7000):
+    '''
+    Uncompressed CallGetInterfaceLanguageData payload with count strings
+    '''
+    header_size = 4 + 8 * count
+    body = bytearray()
+    offsets = []
+
+    for i in range(count):
+        body += b'\x00' * (-(header_size + len(body)) % 4)
+        offsets.append((header_size + len(body)) // 4)
+        body += f'Interface string {i} used by the MakeMKV user interface'.encode('utf-16-le') + b'\x00\x00'
+
+    return struct.pack(f'<I{count}I{count}I', count, *range(1, count + 1), *offsets) + bytes(body)
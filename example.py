@@ -9,6 +9,7 @@ from tqdm import tqdm
 from mmkv_abi.drive_info.drive_state import DriveState
 from mmkv_abi.mmkv import MakeMKV
 from mmkv_abi.app_string import AppString
+from mmkv_abi.progress import BAR_MAX, ProgressKind
 
 async def main():
     makemkv = MakeMKV(setup_logger(logging.INFO))
@@ -25,13 +26,11 @@ async def main():
     print('Waiting for disc...')
     await wait_for_disc_inserted(makemkv)
 
-    print('Waiting for titles...')
-    await wait_for_titles_populated(makemkv)
-
     lower_bound = timedelta(minutes=20)
     upper_bound = timedelta(minutes=50)
 
-    for title in makemkv.titles:
+    print('Waiting for titles...')
+    async for title in makemkv.scan_titles():
         duration = await title.get_duration()
         await title.set_enabled(duration > lower_bound and duration < upper_bound)
 
@@ -41,19 +40,21 @@ async def main():
     print('\n\nSaving selected titles...')
     await makemkv.save_all_selected_to_mkv()
 
-    with tqdm(total=65536) as pbar:
-        while makemkv.job_mode:
-            if pbar.n > makemkv.total_bar:
-                pbar.reset()
-                pbar.update(makemkv.total_bar)
-            else:
-                pbar.update(makemkv.total_bar - pbar.n)
+    if not makemkv.job_mode:
+        return
+
+    with tqdm(total=BAR_MAX) as pbar:
+        async for progress in makemkv.progress():
+            if progress.kind is ProgressKind.JobFinished:
+                break
+
+            pbar.n = int(progress.total * BAR_MAX)
+            pbar.set_description(progress.total_info)
 
-            pbar.set_description(makemkv.current_info[4])
-            pbar.set_postfix_str(makemkv.current_info[3])
+            eta = '' if progress.job_eta is None else f', {timedelta(seconds=int(progress.job_eta))} left'
+            pbar.set_postfix_str(f'{progress.current_info}{eta}')
 
-            await makemkv.idle()
-            await asyncio.sleep(0.25)
+    await makemkv.close()
 
 def setup_logger(log_level):
     logger = getLogger(__name__)
@@ -66,20 +67,8 @@ def setup_logger(log_level):
     return logger
 
 async def wait_for_disc_inserted(makemkv):
-    while True:
-        drives = [v for v in makemkv.drives.values() if v.drive_state is DriveState.Inserted]
-        if len(drives) > 0:
-            drive = drives[0]
-            await makemkv.open_cd_disk(drive.drive_id)
-            break
-
-        await makemkv.idle()
-        await asyncio.sleep(0.25)
-
-async def wait_for_titles_populated(makemkv):
-    while makemkv.titles is None:
-        await makemkv.idle()
-        await asyncio.sleep(0.25)
+    drive = await makemkv.wait_for(DriveState.Inserted)
+    await makemkv.open_cd_disk(drive.drive_id)
 
 if __name__ == '__main__':
     asyncio.run(main())
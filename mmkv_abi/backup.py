@@ -0,0 +1,220 @@
+'''
+Full disc backups. Stream files are verified while the backup is still running: once makemkvcon
+has moved on from a file it is hashed in a thread pool, read through mmap, so only the last few
+files are left to hash when the job finishes.
+'''
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from logging import getLogger
+import mmap
+import os
+import time
+
+from .progress import ProgressKind, ProgressTracker, SMOOTHING
+
+BACKUP_DECRYPT = 1
+HASH_CHUNK = 16 * 1024 * 1024
+SCAN_INTERVAL = 1.0
+
+FileVerified = namedtuple('FileVerified', ('path', 'size', 'digest', 'elapsed'))
+FileVerified.__doc__ = '''
+A backed up file was hashed. path is relative to the destination and elapsed is the time since
+the backup started.
+'''
+
+BackupResult = namedtuple('BackupResult', ('destination', 'files', 'elapsed', 'verify_lag'))
+BackupResult.__doc__ = '''
+files maps each file's path relative to the destination to its digest. verify_lag is how long
+hashing took to finish after makemkvcon left job mode.
+'''
+
+
+def hash_file(path, hash_name = 'sha256'):
+    '''
+    Returns (size, hex digest) of a file, mapped rather than read so no data is copied
+    '''
+    digest = hashlib.new(hash_name)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0, digest.hexdigest()
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            with memoryview(mapped) as view:
+                # hashlib releases the GIL for large updates, so pool threads hash in parallel
+                for pos in range(0, size, HASH_CHUNK):
+                    digest.update(view[pos:pos + HASH_CHUNK])
+
+    return size, digest.hexdigest()
+
+
+class BackupJob:
+    '''
+    A running CallBackupDisc job, see MakeMKV.backup_disc. events() yields the job's
+    ProgressEvents along with a FileVerified for every file hashed and wait() returns the
+    BackupResult.
+
+    A file counts as complete once its size and modification time are unchanged between two
+    scans and a newer file exists. Anything modified after it was hashed is hashed again, and
+    everything left is hashed when the job finishes.
+    '''
+    def __init__(self, makemkv, destination, hash_name = 'sha256', workers = None, smoothing = SMOOTHING,
+                 scan_interval = SCAN_INTERVAL, logger = None):
+        self.destination = destination
+        self.files = {}
+
+        if logger is None:
+            logger = getLogger(__name__)
+
+        self.logger = logger
+
+        self._root = os.path.expanduser(destination)
+        self._hash_name = hash_name
+        self._scan_interval = scan_interval
+        # Subscribe before the job is started so JobStarted is not missed
+        self._source = makemkv.events()
+        self._tracker = ProgressTracker(smoothing, makemkv.current_info[3], makemkv.current_info[4])
+        self._executor = ThreadPoolExecutor(
+            workers or min(4, os.cpu_count() or 1), thread_name_prefix='mmkv-verify'
+        )
+        self._queue = asyncio.Queue()
+        self._seen = {}
+        self._hashed = {}
+        self._hashing = {}
+        self._started = time.monotonic()
+        self._task = None
+
+    def start(self, running):
+        '''
+        running is whether makemkvcon entered job mode; if not, whatever is in the destination is
+        hashed straight away
+        '''
+        self._task = asyncio.create_task(self._run(running))
+
+    async def events(self):
+        '''
+        Yields ProgressEvents and FileVerified until the backup has finished and been verified.
+        Only one consumer is supported.
+        '''
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                return
+
+            yield event
+
+    async def wait(self):
+        return await self._task
+
+    async def cancel(self):
+        '''
+        Stops following the job and hashing files. The backup itself keeps going; cancel it with
+        makemkvcon's own job control.
+        '''
+        if self._task is None:
+            # The job never started, so nothing else will drop the subscription made for it
+            self._source.unsubscribe()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self, running):
+        try:
+            if running:
+                await self._follow()
+
+            finished = time.monotonic()
+
+            # Hash whatever is left, and again anything that changed while it was being hashed
+            while True:
+                self._scan(True)
+                if not self._hashing:
+                    break
+
+                await asyncio.wait(list(self._hashing.values()))
+
+            return BackupResult(
+                self.destination, dict(self.files), time.monotonic() - self._started, time.monotonic() - finished
+            )
+        finally:
+            # Not followed at all when makemkvcon never entered job mode
+            self._source.unsubscribe()
+
+            for task in self._hashing.values():
+                task.cancel()
+
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._queue.put_nowait(None)
+
+    async def _follow(self):
+        loop = asyncio.get_running_loop()
+        last_scan = loop.time()
+
+        try:
+            async for event in self._source:
+                progress = self._tracker.update(event)
+                if progress is not None:
+                    self._queue.put_nowait(progress)
+                    if progress.kind is ProgressKind.JobFinished:
+                        return
+
+                now = loop.time()
+                if now - last_scan >= self._scan_interval:
+                    last_scan = now
+                    self._scan(False)
+        finally:
+            await self._source.aclose()
+
+    def _scan(self, final):
+        current = {}
+        for root, _, names in os.walk(self._root):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                current[path] = (stat.st_size, stat.st_mtime_ns)
+
+        newest = max(current, key=lambda path: current[path][1], default=None)
+        for path, stat in current.items():
+            if path in self._hashing or self._hashed.get(path) == stat:
+                continue
+
+            if final or (path != newest and self._seen.get(path) == stat):
+                self._hash(path, stat)
+
+        self._seen = current
+
+    def _hash(self, path, stat):
+        future = asyncio.get_running_loop().run_in_executor(self._executor, hash_file, path, self._hash_name)
+        self._hashing[path] = future
+        future.add_done_callback(lambda future: self._hashed_file(path, stat, future))
+
+    def _hashed_file(self, path, stat, future):
+        del self._hashing[path]
+        if future.cancelled():
+            return
+
+        try:
+            size, digest = future.result()
+        except FileNotFoundError:
+            return
+        except OSError:
+            self.logger.exception('Failed to hash %s', path)
+            return
+
+        # Compared with the next scan, so a file that changed in the meantime is hashed again
+        self._hashed[path] = stat
+
+        relative = os.path.relpath(path, self._root)
+        self.files[relative] = digest
+        self._queue.put_nowait(FileVerified(relative, size, digest, time.monotonic() - self._started))
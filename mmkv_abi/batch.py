@@ -0,0 +1,199 @@
+'''
+Batch conversion of disc backups. Images and BDMV/VIDEO_TS folders found under a directory are
+fanned out across a bounded number of makemkvcon sessions, each reused from one source to the
+next with open_file and close_disc.
+'''
+import asyncio
+from collections import Counter, deque, namedtuple
+from logging import getLogger
+import os
+
+from .command import Command
+from .exception import OpenFailed
+from .mmkv import MakeMKV
+
+IMAGE_EXTENSIONS = ('.iso',)
+DISC_FOLDERS = {'BDMV': 'bdmv', 'VIDEO_TS': 'dvd'}
+PER_DEVICE = 2
+SCAN_TIMEOUT = 600
+
+Source = namedtuple('Source', ('path', 'kind', 'device', 'size'))
+Source.__doc__ = '''
+A disc backup: an image file (kind 'iso') or a folder holding BDMV ('bdmv') or VIDEO_TS ('dvd').
+device is the st_dev of the storage it is on and size its size in bytes.
+'''
+
+
+def _folder_size(path):
+    size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+
+    return size
+
+
+def find_sources(root):
+    '''
+    Yields a Source for every disc image and disc folder under root. Disc folders are not
+    searched any further.
+    '''
+    for path, dirs, names in os.walk(root):
+        kind = next((DISC_FOLDERS[name] for name in dirs if name in DISC_FOLDERS), None)
+        if kind is not None:
+            dirs.clear()
+            yield Source(path, kind, os.stat(path).st_dev, _folder_size(path))
+            continue
+
+        for name in names:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = os.path.join(path, name)
+                stat = os.stat(image)
+                yield Source(image, 'iso', stat.st_dev, stat.st_size)
+
+
+async def _scan(makemkv):
+    async for _ in makemkv.scan_titles():
+        pass
+
+
+async def rip(makemkv, source, output_folder, select = None, scan_timeout = SCAN_TIMEOUT):
+    '''
+    A BatchRunner job: opens source, waits up to scan_timeout seconds for its titles, lets
+    select(titles) change the selection makemkvcon made and saves the selected titles to
+    output_folder. Raises OpenFailed if makemkvcon can't open source.
+    '''
+    if not await makemkv.open_file(source.path):
+        raise OpenFailed(source.path)
+
+    # A bad image may never produce a complete title collection; don't let it hold the worker
+    await asyncio.wait_for(_scan(makemkv), scan_timeout)
+
+    if select is not None:
+        await select(makemkv.titles)
+
+    await makemkv.set_output_folder(output_folder)
+
+    # Subscribe before saving so leaving job mode can't be missed
+    events = makemkv.events()
+    try:
+        await makemkv.save_all_selected_to_mkv()
+
+        if makemkv.job_mode:
+            async for event in events:
+                if event.cmd is Command.BackLeaveJobMode:
+                    break
+    finally:
+        await events.aclose()
+
+
+class BatchRunner:
+    '''
+    Runs job(makemkv, source) for many Sources on up to sessions concurrent makemkvcon sessions,
+    by default half the CPU count, with at most per_device jobs reading from any one storage
+    device at a time. Whenever a session is free it takes the largest waiting source from the
+    device with the fewest jobs running, so devices are read from evenly and the longest jobs
+    don't end up last. A session whose job failed is replaced.
+    '''
+    def __init__(self, job, sessions = None, per_device = PER_DEVICE, logger = None, session_factory = MakeMKV):
+        self.sessions = sessions or max(1, (os.cpu_count() or 2) // 2)
+        self.per_device = per_device
+        self.results = {}
+
+        if logger is None:
+            logger = getLogger(__name__)
+
+        self.logger = logger
+
+        self._job = job
+        self._session_factory = session_factory
+        self._pending = {}
+        self._running = Counter()
+        self._changed = None
+
+    async def run(self, sources):
+        '''
+        Runs every source and returns {path: result}, where a failed job's result is its exception
+        '''
+        for source in sorted(sources, key=lambda source: source.size, reverse=True):
+            self._pending.setdefault(source.device, deque()).append(source)
+
+        self._changed = asyncio.Condition()
+        count = sum(len(queue) for queue in self._pending.values())
+        workers = [asyncio.create_task(self._worker()) for _ in range(min(self.sessions, count))]
+
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return self.results
+
+    async def run_directory(self, root):
+        sources = await asyncio.get_running_loop().run_in_executor(None, lambda: list(find_sources(root)))
+        return await self.run(sources)
+
+    def _next(self):
+        devices = [
+            device for device, queue in self._pending.items() if queue and self._running[device] < self.per_device
+        ]
+        if not devices:
+            return None
+
+        device = min(devices, key=lambda device: (self._running[device], -self._pending[device][0].size))
+        return self._pending[device].popleft()
+
+    async def _worker(self):
+        session = None
+        try:
+            while True:
+                source = self._next()
+                if source is None:
+                    if not any(self._pending.values()):
+                        return
+
+                    # Everything left is on devices that are busy
+                    async with self._changed:
+                        await self._changed.wait()
+
+                    continue
+
+                self._running[source.device] += 1
+                try:
+                    if session is None:
+                        session = self._session_factory(self.logger)
+                        await session.init()
+
+                    self.results[source.path] = await self._job(session, source)
+                    await session.close_disc()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.exception('Job for %s failed', source.path)
+                    self.results[source.path] = e
+
+                    if session is not None:
+                        await self._retire(session)
+                        session = None
+                finally:
+                    self._running[source.device] -= 1
+                    async with self._changed:
+                        self._changed.notify_all()
+        finally:
+            if session is not None:
+                await self._retire(session, shutdown=True)
+
+    async def _retire(self, session, shutdown = False):
+        try:
+            if shutdown:
+                await session.shutdown()
+            else:
+                await session.close()
+        except Exception:
+            self.logger.exception('Failed to close a session')
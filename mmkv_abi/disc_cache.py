@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import time
+
+from .item_attribute import ItemAttribute
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'mmkv_abi')
+
+
+class DiscCache:
+    '''
+    Persistent store of scanned title trees keyed by DriveInfo.fingerprint(). Everything in the
+    nodes' info caches is stored along with their selection state, so a known disc only needs its
+    title, chapter and track counts checked against the fresh scan before the values are reused.
+    '''
+    def __init__(self, path = None):
+        if path is None:
+            os.makedirs(default_cache_dir(), exist_ok=True)
+            path = os.path.join(default_cache_dir(), 'discs.sqlite3')
+
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS discs (fingerprint TEXT PRIMARY KEY, updated REAL, tree TEXT)'
+        )
+        self._db.commit()
+
+    def __contains__(self, fingerprint):
+        return self._db.execute(
+            'SELECT 1 FROM discs WHERE fingerprint = ?', (fingerprint,)
+        ).fetchone() is not None
+
+    def store(self, fingerprint: str, titles):
+        '''
+        Stores a title tree. Raises ValueError if makemkvcon has not reported all of it yet.
+        '''
+        if not titles.complete:
+            raise ValueError('Only complete title trees can be stored')
+
+        tree = self._dump_node(titles)
+        tree['titles'] = [
+            {
+                **self._dump_node(title),
+                'chapters': [self._dump_node(chapter) for chapter in title.chapters],
+                'tracks': [self._dump_node(track) for track in title.tracks]
+            }
+            for title in titles
+        ]
+
+        self._db.execute(
+            'INSERT OR REPLACE INTO discs (fingerprint, updated, tree) VALUES (?, ?, ?)',
+            (fingerprint, time.time(), json.dumps(tree))
+        )
+        self._db.commit()
+
+    async def restore(self, fingerprint: str, titles, apply_selection = False):
+        '''
+        Fills the info caches of a freshly scanned title tree from a stored one. Returns False if
+        the disc is unknown or the stored tree does not have the same shape. With apply_selection
+        the stored selection states are sent to makemkvcon as well.
+        '''
+        row = self._db.execute('SELECT tree FROM discs WHERE fingerprint = ?', (fingerprint,)).fetchone()
+        if row is None:
+            return False
+
+        tree = json.loads(row[0])
+        if not self._matches(tree, titles):
+            return False
+
+        states = []
+        pairs = [(titles, tree)]
+        for title, stored in zip(titles, tree['titles']):
+            pairs.append((title, stored))
+            pairs.extend(zip(title.chapters, stored['chapters']))
+            pairs.extend(zip(title.tracks, stored['tracks']))
+
+        for node, stored in pairs:
+            for name, value in stored['info'].items():
+                node._info_cache[ItemAttribute[name]] = value
+
+            if apply_selection and stored['state'] is not None and stored['state'] != node._state:
+                node._state = stored['state']
+                states.append((node._handle, node._state))
+
+        if states:
+            await titles._makemkv().set_ui_item_states(states)
+
+        return True
+
+    def remove(self, fingerprint: str):
+        self._db.execute('DELETE FROM discs WHERE fingerprint = ?', (fingerprint,))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    @staticmethod
+    def _dump_node(node):
+        return {
+            'info': {item_attribute.name: value for item_attribute, value in (node._info or {}).items()},
+            'state': node._state
+        }
+
+    @staticmethod
+    def _matches(tree, titles):
+        if len(tree['titles']) != len(titles):
+            return False
+
+        return all(
+            title is not None and
+            len(stored['chapters']) == len(title.chapters) and
+            len(stored['tracks']) == len(title.tracks) and
+            None not in title.chapters and None not in title.tracks
+            for title, stored in zip(titles, tree['titles'])
+        )
@@ -1,6 +1,7 @@
+from collections import namedtuple
 from datetime import datetime
 from enum import IntEnum
-import pprint
+import hashlib
 import struct
 
 from .drive_state import DriveState
@@ -56,267 +57,408 @@ class DriveInfoId(IntEnum):
     Aacs_BindingNonce = (DriveInfoCategory.DiscSpecific.value << 24) + (0<<16) + 0x7e
 
 
-class DriveInfo:
-    def __init__(self):
-        # Header info
-        self.drive_id = None
-        self.drive_name = None
-        self.disc_name = None
-        self.device_name = None
+MMC_PROFILES = {
+    8: 'CD-ROM',
+    9: 'CD-R',
+    10: 'CD-RW',
+    16: 'DVD-ROM',
+    17: 'DVD-R',
+    18: 'DVD-RAM',
+    19: 'DVD-RW',
+    20: 'DVD-RW',
+    21: 'DVD-R DL SR',
+    22: 'DVD-R DL JR',
+    23: 'DVD-RW DL',
+    26: 'DVD+RW',
+    27: 'DVD+R',
+    42: 'DVD+RW DL',
+    43: 'DVD+R DL',
+    64: 'BD-ROM',
+    65: 'BD-R SRM',
+    66: 'BD-R RRM',
+    67: 'BD-RE',
+    80: 'HD DVD-ROM',
+    81: 'HD DVD-R',
+    82: 'HD DVD-RAM',
+    83: 'HD DVD-RW',
+    88: 'HD DVD-R DL',
+    90: 'HD DVD-RW DL'
+}
+
+DVD_DISC_TYPES = {
+    0: 'DVD-ROM',
+    1: 'DVD-RAM',
+    2: 'DVD-R',
+    3: 'DVD-RW',
+    4: 'HD DVD-ROM',
+    5: 'HD DVD-RAM',
+    6: 'HD DVD-R',
+    9: 'DVD+RW',
+    10: 'DVD+R',
+    11: 'DVD+RW DL',
+    12: 'DVD+R DL'
+}
+
+DVD_DISC_SIZES = {
+    0: '120mm',
+    1: '80mm'
+}
+
+DVD_READ_RATES = {
+    0: 0.25,
+    1: 0.5,
+    2: 1,
+    3: 2,
+    4: 3
+}
+
+BD_DISC_TYPES = {
+    1: 'BD-ROM',
+    2: 'BD-R',
+    4: 'BD-RE',
+    9: 'BD-ROM UHD'
+}
+
+BD_DISC_IDS = (b'BDO', b'BDW', b'BDR', b'BDU')
+
+BD_CHANNEL_BIT_LENGTHS = {
+    1: '74.5 nm',
+    2: '69.0 nm'
+}
+
+AACS_VERSIONS = {
+    10: '1.0/II',
+    20: '2.0',
+    21: '2.1'
+}
+
+AACS_CATEGORIES = {
+    0: 'C',
+    1: 'B',
+    2: 'A'
+}
+
+TLV_HEADER = struct.Struct('>II')
+
+DriveChange = namedtuple('DriveChange', ('drive_info', 'old_state', 'new_state', 'disc_changed', 'changed'))
+DriveChange.__doc__ = '''
+The value of a BackUpdateDrive event that changed something. changed is the set of DriveInfo
+fields that changed and disc_changed is set when a disc was inserted, removed or swapped.
+'''
+
+
+def _parse_timestamp(data):
+    year = int(str(data[4:8], 'ascii'))
+    month = int(str(data[8:10], 'ascii'))
+    day = int(str(data[10:12], 'ascii'))
+
+    hour = int(str(data[12:14], 'ascii'))
+    minute = int(str(data[14:16], 'ascii'))
+
+    if data[16:17] != b'\x00' and data[16:17] != b'\x20':
+        second = int(str(data[16:18], 'ascii'))
+    else:
+        second = 0
+
+    return datetime(year, month, day, hour, minute, second)
+
+
+# Each TLV parser takes a block's payload and returns the (field, value) pairs it sets
+
+def _parse_driveio_tag(data):
+    return (('driveio_tag', str(data[:-1], 'utf-8').strip()),)
+
+
+def _parse_inquiry_data(data):
+    if len(data) < 36:
+        return ()
+
+    manufacturer = str(data[8:16], 'utf-8').strip()  # 8 bytes
+    product = str(data[16:32], 'utf-8').strip()  # 16 bytes
+    revision = str(data[32:36], 'utf-8').strip()  # 4 bytes
+    return (('inquiry_data', InquiryData(manufacturer, product, revision)),)
+
+
+def _parse_serial_number(data):
+    if len(data) < 8:
+        return ()
+
+    return (('drive_serial_number', str(data[4:data[3]], 'utf-8')),)
+
+
+def _parse_firmware_information(data):
+    if len(data) != 20:
+        return ()
+
+    return (('drive_firmware_date', _parse_timestamp(data)),)
+
+
+def _parse_firmware_details(data):
+    return (('drive_firmware_string', str(data, 'utf-8')),)
+
+
+def _parse_current_profile(data):
+    if len(data) < 2:
+        return ()
+
+    return (('current_profile', MMC_PROFILES.get(int.from_bytes(data, 'big'))),)
+
+
+def _parse_disc_capacity(data):
+    if len(data) < 8:
+        return ()
+
+    return (('disc_capacity', int.from_bytes(data[:4], 'big') / 1024 / 512),)
+
+
+def _parse_dvd_copyright_information(data):
+    if len(data) < 8:
+        return ()
+
+    protection = data[4]
+    if protection == 1:
+        return (('disc_has_css', True),)
+    elif protection == 2:
+        return (('disc_has_cprm', True),)
+    elif protection == 3 or protection == 16:
+        return (('disc_has_aacs', True),)
+
+    return ()
+
+
+def _parse_dvd_physical_format(data):
+    if len(data) < 16:
+        return ()
+
+    return (
+        ('disc_type', DVD_DISC_TYPES.get(data[4] >> 4)),
+        ('disc_size', DVD_DISC_SIZES.get(data[5] >> 4)),
+        ('disc_read_rate', DVD_READ_RATES.get(data[5] & 0x0f)),
+        ('disc_layers', 1 + (data[6] >> 5 & 3)),
+        ('disc_layer_orientation', 'PTP' if data[6] & 16 == 0 else 'OTP')
+    )
+
+
+def _parse_bd_disc_information(data):
+    if len(data) < 20 or data[4:7] != b'DI\x01' or data[12:15] not in BD_DISC_IDS:
+        return ()
 
-        # Additional info
-        self.driveio_tag = None
-        self.current_profile = None
-        self.libredrive_info = None
+    return (
+        ('disc_type', BD_DISC_TYPES.get(data[16] & 0x0f)),
+        ('disc_layers', data[16] >> 4),
+        ('disc_channel_bit_length', BD_CHANNEL_BIT_LENGTHS.get(data[17] & 0x0f))
+    )
 
-        self.disc_timestamp = None
 
-        self.disc_has_css = False
-        self.disc_has_cprm = False
-        self.disc_has_aacs = False
-        self.disc_has_bdsvm = False
+def _parse_aacs_mkb(data):
+    if len(data) < 12 or data[0] != 0x10:
+        return ()
 
-        self.disc_aacs_mkb_version = None
-        self.disc_aacs_version = None
-        self.disc_aacs_category = None
+    return (
+        ('disc_aacs_mkb_version', int.from_bytes(data[8:12], 'big')),
+        ('disc_aacs_version', AACS_VERSIONS.get(data[5], '1.0'))
+    )
 
-        self.disc_svm_version = None
 
-        # Feature Descriptors
-        self.drive_state = None
+def _parse_svm(data):
+    if len(data) < 17:
+        return ()
 
-        self.drive_serial_number = None
-        self.drive_firmware_date = None
-        self.drive_firmware_string = None
-        self.drive_highest_aacs = None
+    return (('disc_svm_version', f'{int.from_bytes(data[13:15], "big")}.{data[15]}'),)
 
-        # Disc Structure
-        self.disc_capacity = None
-        self.disc_type = None
-        self.disc_size = None
-        self.disc_read_rate = None
-        self.disc_layers = None
-        self.disc_layer_orientation = None
-        self.disc_channel_bit_length = None
+
+def _parse_aacs_category(data):
+    if len(data) < 4:
+        return ()
+
+    return (('disc_aacs_category', AACS_CATEGORIES.get(data[1])),)
+
+
+def _parse_highest_aacs(data):
+    if len(data) != 4:
+        return ()
+
+    return (('drive_highest_aacs', int.from_bytes(data, 'big')),)
+
+
+def _parse_disc_timestamp(data):
+    if len(data) != 20:
+        return ()
+
+    return (('disc_timestamp', _parse_timestamp(data)),)
+
+
+def _parse_libredrive_info(data):
+    return (('libredrive_info', str(data[:-2], 'utf-8').split('\n')[1:]),)
+
+
+TLV_PARSERS = {
+    DriveInfoId.DriveioTag.value: _parse_driveio_tag,
+    DriveInfoId.InquiryData.value: _parse_inquiry_data,
+    DriveInfoId.FeatureDescriptor_DriveSerialNumber.value: _parse_serial_number,
+    DriveInfoId.FeatureDescriptor_FirmwareInformation.value: _parse_firmware_information,
+    DriveInfoId.FirmwareDetailsString.value: _parse_firmware_details,
+    DriveInfoId.CurrentProfile.value: _parse_current_profile,
+    DriveInfoId.DiscCapacity.value: _parse_disc_capacity,
+    DriveInfoId.DiscStructure_DVD_CopyrightInformation.value: _parse_dvd_copyright_information,
+    DriveInfoId.DiscStructure_DVD_PhysicalFormat.value: _parse_dvd_physical_format,
+    DriveInfoId.DiscStructure_BD_DiscInformation.value: _parse_bd_disc_information,
+    0x05102201: _parse_aacs_mkb,
+    0x05102202: _parse_svm,
+    0x05102203: _parse_aacs_category,
+    0x05102204: _parse_highest_aacs,
+    0x05102205: _parse_disc_timestamp,
+    0x05102210: _parse_libredrive_info
+}
+
+FIELD_DEFAULTS = {
+    # Header info
+    'drive_name': None,
+    'disc_name': None,
+    'device_name': None,
+
+    # Additional info
+    'driveio_tag': None,
+    'current_profile': None,
+    'libredrive_info': None,
+    'inquiry_data': None,
+
+    'disc_timestamp': None,
+
+    'disc_has_css': False,
+    'disc_has_cprm': False,
+    'disc_has_aacs': False,
+    'disc_has_bdsvm': False,
+
+    'disc_aacs_mkb_version': None,
+    'disc_aacs_version': None,
+    'disc_aacs_category': None,
+
+    'disc_svm_version': None,
+
+    # Feature Descriptors
+    'drive_state': None,
+
+    'drive_serial_number': None,
+    'drive_firmware_date': None,
+    'drive_firmware_string': None,
+    'drive_highest_aacs': None,
+
+    # Disc Structure
+    'disc_capacity': None,
+    'disc_type': None,
+    'disc_size': None,
+    'disc_read_rate': None,
+    'disc_layers': None,
+    'disc_layer_orientation': None,
+    'disc_channel_bit_length': None
+}
+
+# The fields that identify the disc in the drive
+DISC_FIELDS = (
+    'disc_name', 'disc_aacs_mkb_version', 'disc_timestamp', 'disc_capacity', 'disc_type', 'disc_size',
+    'disc_read_rate', 'disc_layers', 'disc_layer_orientation', 'disc_channel_bit_length'
+)
+
+
+class DriveInfo:
+    '''
+    The state of one drive as reported by BackUpdateDrive. MakeMKV keeps one per drive and
+    applies every update to it in place, TLV blocks whose bytes have not changed since the
+    previous update are not parsed again.
+    '''
+    __slots__ = ('drive_id', *FIELD_DEFAULTS, '_args', '_data', '_blocks')
+
+    def __init__(self):
+        self.drive_id = None
+
+        for field, default in FIELD_DEFAULTS.items():
+            setattr(self, field, default)
+
+        self._args = None
+        self._data = None
+        # {TLV id: (payload, (field, value) pairs)} from the previous update
+        self._blocks = {}
 
     @classmethod
     def from_update(cls, args, data):
         if len(data) == 0:
             return None
 
-        data_view = memoryview(data)
         instance = cls()
+        instance.update(args, data)
+        return instance
 
-        instance.drive_id = args[0]
-        instance.drive_state = DriveState(args[2])
+    def update(self, args, data):
+        '''
+        Applies a BackUpdateDrive message and returns a DriveChange, or None if nothing changed
+        '''
+        data = bytes(data)
+        if data == self._data and args == self._args:
+            return None
+
+        before = self._snapshot()
+        old_state = self.drive_state
 
-        disc_fs_flags = args[3]
-        instance.disc_has_aacs = disc_fs_flags & 8 != 0
-        instance.disc_has_bdsvm = disc_fs_flags & 16 != 0
+        self.drive_id = args[0]
+        values = [
+            ('drive_state', DriveState(args[2])),
+            ('disc_has_aacs', args[3] & 8 != 0),
+            ('disc_has_bdsvm', args[3] & 16 != 0)
+        ]
 
         flags = args[1]
-        start_idx = end_idx = 0
+        end_idx = 0
+        for bit, field in ((1, 'drive_name'), (2, 'disc_name'), (4, 'device_name')):
+            if flags & bit == bit:
+                start_idx = end_idx
+                end_idx = data.find(b'\x00', start_idx) + 1
+                values.append((field, str(data[start_idx:end_idx - 1], 'utf-8')))
+
+        previous = self._blocks
+        blocks = {}
+        while end_idx < len(data):
+            cmd_id, data_size = TLV_HEADER.unpack_from(data, end_idx)
+            start_idx = end_idx + 8
+            end_idx = start_idx + data_size
 
-        if flags & 1 == 1:
-            end_idx = data.find(b'\x00', start_idx) + 1
-            instance.drive_name = str(data_view[start_idx:end_idx - 1], 'utf-8')
-            start_idx = end_idx
+            payload = data[start_idx:end_idx]
+            block = previous.get(cmd_id)
+            if block is None or block[0] != payload:
+                parser = TLV_PARSERS.get(cmd_id)
+                block = (payload, parser(payload) if parser is not None else ())
 
-        if flags & 2 == 2:
-            end_idx = data.find(b'\x00', start_idx) + 1
-            instance.disc_name = str(data_view[start_idx:end_idx - 1], 'utf-8')
-            start_idx = end_idx
+            blocks[cmd_id] = block
+            values.extend(block[1])
 
-        if flags & 4 == 4:
-            end_idx = data.find(b'\x00', start_idx) + 1
-            instance.device_name = str(data_view[start_idx:end_idx - 1], 'utf-8')
-            start_idx = end_idx
+        if self._data is not None:
+            # Start over from the defaults so fields of blocks that are no longer sent are cleared
+            for field, default in FIELD_DEFAULTS.items():
+                setattr(self, field, default)
 
-        while end_idx < len(data):
-            start_idx = end_idx
-            end_idx += 8
-            cmd_id, data_size = struct.unpack('>II', data_view[start_idx:end_idx])
-
-            start_idx = end_idx
-            end_idx += data_size
-
-            if cmd_id == DriveInfoId.DriveioTag:
-                instance.driveio_tag = str(data_view[start_idx:end_idx - 1], 'utf-8').strip()
-            elif cmd_id == DriveInfoId.InquiryData:
-                if data_size >= 36:
-                    manufacturer = str(data[start_idx + 8:start_idx + 16], 'utf-8').strip()  # 8 bytes
-                    product = str(data[start_idx + 16:start_idx + 32], 'utf-8').strip()  # 16 bytes
-                    revision = str(data[start_idx + 32:start_idx + 36], 'utf-8').strip()  # 4 bytes
-                    instance.inquiry_data = InquiryData(manufacturer, product, revision)
-            elif cmd_id == DriveInfoId.FeatureDescriptor_DriveSerialNumber:
-                if data_size >= 8:
-                    size = int(data_view[start_idx + 3])
-                    instance.drive_serial_number = str(data_view[start_idx + 4:start_idx + size], 'utf-8')
-            elif cmd_id == DriveInfoId.FeatureDescriptor_FirmwareInformation:
-                if data_size == 20:
-                    instance.drive_firmware_date = instance._parse_timestamp(data_view[start_idx:end_idx])
-            elif cmd_id == DriveInfoId.FirmwareDetailsString:
-                instance.drive_firmware_string = str(data_view[start_idx:end_idx], 'utf-8')
-            elif cmd_id == DriveInfoId.CurrentProfile:
-                if data_size >= 2:
-                    profile_id = int.from_bytes(data_view[start_idx:end_idx], 'big')
-                    instance.current_profile = cls._get_mmc_profile_string(profile_id)
-            elif cmd_id == DriveInfoId.DiscCapacity:
-                if data_size >= 8:
-                    sec_size = int.from_bytes(data_view[start_idx:start_idx + 4], 'big')
-                    instance.disc_capacity = sec_size / 1024 / 512
-            elif cmd_id == DriveInfoId.DiscStructure_DVD_CopyrightInformation:
-                if data_size >= 8:
-                    protection = int(data_view[start_idx + 4])
-                    if protection == 1:
-                        instance.disc_has_css = True
-                    elif protection == 2:
-                        instance.disc_has_cprm = True
-                    elif protection == 3 or protection == 16:
-                        instance.disc_has_aacs = True
-            elif cmd_id == DriveInfoId.DiscStructure_DVD_PhysicalFormat:
-                if data_size < 16:
-                    continue
-
-                instance.disc_type = {
-                    0: 'DVD-ROM',
-                    1: 'DVD-RAM',
-                    2: 'DVD-R',
-                    3: 'DVD-RW',
-                    4: 'HD DVD-ROM',
-                    5: 'HD DVD-RAM',
-                    6: 'HD DVD-R',
-                    9: 'DVD+RW',
-                    10: 'DVD+R',
-                    11: 'DVD+RW DL',
-                    12: 'DVD+R DL'
-                }.get(int(data_view[start_idx + 4]) >> 4)
-
-                instance.disc_size = {
-                    0: '120mm',
-                    1: '80mm'
-                }.get(int(data_view[start_idx + 5]) >> 4)
-
-                instance.disc_read_rate = {
-                    0: 0.25,
-                    1: 0.5,
-                    2: 1,
-                    3: 2,
-                    4: 3
-                }.get(int(data_view[start_idx + 5]) & 0x0f)
-
-                instance.disc_layers = 1 + (int(data_view[start_idx + 6]) >> 5 & 3)
-                instance.disc_layer_orientation = 'PTP' if int(data_view[start_idx + 6]) & 16 == 0 else 'OTP'
-            elif cmd_id == DriveInfoId.DiscStructure_BD_DiscInformation:
-                if data_size < 20:
-                    continue
-
-                if (
-                    data_view[start_idx + 4:start_idx + 7] == b'DI\x01' and
-                    bytes(data_view[start_idx + 12:start_idx + 15]) in [b'BDO', b'BDW', b'BDR', b'BDU']
-                ):
-                    instance.disc_type = {
-                        1: 'BD-ROM',
-                        2: 'BD-R',
-                        4: 'BD-RE',
-                        9: 'BD-ROM UHD'
-                    }.get(int(data_view[start_idx + 16]) & 0x0f)
-
-                    instance.disc_layers = int(data_view[start_idx + 16]) >> 4
-
-                    instance.disc_channel_bit_length = {
-                        1: '74.5 nm',
-                        2: '69.0 nm'
-                    }.get(int(data_view[start_idx + 17]) & 0x0f)
-            elif cmd_id == 0x05102201:
-                if data_size < 12:
-                    continue
-
-                if int(data_view[start_idx]) != 0x10:
-                    continue
-
-                instance.disc_aacs_mkb_version = int.from_bytes(data_view[start_idx + 8: start_idx + 12], 'big')
-                instance.disc_aacs_version = {
-                    10: '1.0/II',
-                    20: '2.0',
-                    21: '2.1'
-                }.get(int(data_view[start_idx + 5]), '1.0')
-            elif cmd_id == 0x05102202:
-                if data_size < 17:
-                    continue
-
-                svm_year = int.from_bytes(data_view[start_idx + 13:start_idx + 15], 'big')
-                svm_month = int(data_view[start_idx + 15])
-                instance.disc_svm_version = f'{svm_year}.{svm_month}'
-            elif cmd_id == 0x05102203:
-                if data_size < 4:
-                    continue
-
-                instance.disc_aacs_category = {
-                    0: 'C',
-                    1: 'B',
-                    2: 'A'
-                }.get(int(data_view[start_idx + 1]))
-            elif cmd_id == 0x05102204:
-                if data_size != 4:
-                    continue
-
-                instance.drive_highest_aacs = int.from_bytes(data_view[start_idx:end_idx], 'big')
-            elif cmd_id == 0x05102205:
-                if data_size != 20:
-                    continue
-
-                instance.disc_timestamp = instance._parse_timestamp(data_view[start_idx:end_idx])
-            elif cmd_id == 0x05102210:
-                instance.libredrive_info = str(data_view[start_idx:end_idx - 2], 'utf-8').split('\n')[1:]
-            else:
-                #print(cmd_id, data_size, bytes(data_view[start_idx:end_idx]))
-                pass
+        self._args = args
+        self._data = data
+        self._blocks = blocks
 
-        return instance
-    
-    @classmethod
-    def _parse_timestamp(cls, data):
-        year = int(str(data[4:8], 'ascii'))
-        month = int(str(data[8:10], 'ascii'))
-        day = int(str(data[10:12], 'ascii'))
+        for field, value in values:
+            setattr(self, field, value)
 
-        hour = int(str(data[12:14], 'ascii'))
-        minute = int(str(data[14:16], 'ascii'))
+        after = self._snapshot()
+        if after == before:
+            return None
 
-        if data[16:17] != b'\x00' and data[16:17] != b'\x20':
-            second = int(str(data[16:18], 'ascii'))
-        else:
-            second = 0
+        changed = frozenset(field for field, old, new in zip(FIELD_DEFAULTS, before, after) if old != new)
+        return DriveChange(self, old_state, self.drive_state, not changed.isdisjoint(DISC_FIELDS), changed)
 
-        return datetime(year, month, day, hour, minute, second)
+    def fingerprint(self):
+        '''
+        Identifies the disc in the drive from the fields makemkvcon reports before it is opened
+        '''
+        if self.drive_state is not DriveState.Inserted:
+            return None
 
-    @classmethod
-    def _get_mmc_profile_string(cls, _id):
-        return {
-            8: 'CD-ROM',
-            9: 'CD-R',
-            10: 'CD-RW',
-            16: 'DVD-ROM',
-            17: 'DVD-R',
-            18: 'DVD-RAM',
-            19: 'DVD-RW',
-            20: 'DVD-RW',
-            21: 'DVD-R DL SR',
-            22: 'DVD-R DL JR',
-            23: 'DVD-RW DL',
-            26: 'DVD+RW',
-            27: 'DVD+R',
-            42: 'DVD+RW DL',
-            43: 'DVD+R DL',
-            64: 'BD-ROM',
-            65: 'BD-R SRM',
-            66: 'BD-R RRM',
-            67: 'BD-RE',
-            80: 'HD DVD-ROM',
-            81: 'HD DVD-R',
-            82: 'HD DVD-RAM',
-            83: 'HD DVD-RW',
-            88: 'HD DVD-R DL',
-            90: 'HD DVD-RW DL'
-        }.get(_id)
+        key = tuple(getattr(self, field) for field in DISC_FIELDS)
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def _snapshot(self):
+        return tuple(getattr(self, field) for field in FIELD_DEFAULTS)
@@ -9,3 +9,19 @@ class ABIVersionMismatch(RuntimeError):
 class CommunicationError(RuntimeError):
     def __init__(self):
         super().__init__('Communication error has occured. This may be a parsing issue')
+
+class RequestCancelled(RuntimeError):
+    def __init__(self):
+        super().__init__('Request was cancelled before it was sent')
+
+class DiscClosed(RuntimeError):
+    def __init__(self):
+        super().__init__('The disc this title tree belongs to has been closed')
+
+class OpenFailed(RuntimeError):
+    def __init__(self, source):
+        super().__init__(f'makemkvcon could not open {source}')
+
+class MMBDError(RuntimeError):
+    def __init__(self, message):
+        super().__init__(message)
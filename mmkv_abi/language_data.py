@@ -1,27 +1,65 @@
+import mmap
+import struct
+
+
 class LanguageData:
+    '''
+    Interface strings as returned by CallGetInterfaceLanguageData. Only the id to offset index is
+    read up front; strings are decoded the first time they are looked up.
+    '''
     @staticmethod
-    def find_utf16_terminator(data):
-        for i in range(0, len(data), 2):
-            if data[i:i + 2] == b'\x00\x00':
-                return i
-            
-        return None
+    def find_utf16_terminator(data, start = 0):
+        end = start
+        while True:
+            end = data.find(b'\x00\x00', end)
+            if end == -1 or (end - start) % 2 == 0:
+                return None if end == -1 else end - start
+
+            end += 1
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            return cls(data)
+        except ValueError:
+            data.close()
+            raise
 
     def __init__(self, unpacked_data):
+        '''
+        Raises ValueError if unpacked_data is truncated or its index points outside of it
+        '''
+        self._data = unpacked_data
         self._table = {}
 
-        data_view = memoryview(unpacked_data)
-        count = int.from_bytes(data_view[0:4], 'little')
+        if len(unpacked_data) < 4:
+            raise ValueError('Language data is truncated')
 
-        for i in range(4, 4 * (count + 1), 4):
-            _id = int.from_bytes(data_view[i:i + 4], 'little')
-            offset = int.from_bytes(data_view[i + (count * 4):i + (count * 4) + 4], 'little')
+        count = int.from_bytes(unpacked_data[0:4], 'little')
+        if len(unpacked_data) < 4 * (2 * count + 1):
+            raise ValueError('Language data is truncated')
 
-            start = offset * 4
-            end = start + self.find_utf16_terminator(data_view[start:])
-            value = str(data_view[start:end], 'utf-16')
+        ids = struct.unpack_from(f'<{count}I', unpacked_data, 4)
+        offsets = struct.unpack_from(f'<{count}I', unpacked_data, 4 * (count + 1))
+        if offsets and max(offsets) * 4 >= len(unpacked_data):
+            raise ValueError('Language data offsets are out of range')
 
-            self._table[_id] = value
+        self._offsets = dict(zip(ids, offsets))
 
     def __getitem__(self, index):
-        return self._table[index]
+        value = self._table.get(index)
+        if value is None:
+            start = self._offsets[index] * 4
+            end = start + self.find_utf16_terminator(self._data, start)
+            value = self._table[index] = str(self._data[start:end], 'utf-16')
+
+        return value
+
+    def __contains__(self, index):
+        return index in self._offsets
+
+    def __len__(self):
+        return len(self._offsets)
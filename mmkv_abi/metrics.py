@@ -0,0 +1,122 @@
+from bisect import bisect_left
+from collections import Counter
+import time
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5
+)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        '''
+        Returns (upper bound, count) pairs in Prometheus order, ending with +Inf
+        '''
+        total = 0
+        result = []
+        for bound, count in zip((*self.buckets, float('inf')), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {str(bound): count for bound, count in self.cumulative()}
+        }
+
+
+class Metrics:
+    '''
+    Wire level counters for a MakeMKV session: frames and bytes in each direction per Command,
+    request to Return latency and time spent handling back-channel messages and language data
+    '''
+    def __init__(self):
+        self.started = time.monotonic()
+        self.sent = Counter()
+        self.received = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = {}
+        self.handlers = {}
+
+    def frame_sent(self, cmd, size):
+        self.sent[cmd.name] += 1
+        self.bytes_sent += size
+
+    def frame_received(self, cmd, size):
+        self.received[cmd.name] += 1
+        self.bytes_received += size
+
+    def response_received(self, cmd, elapsed):
+        histogram = self.latency.get(cmd.name)
+        if histogram is None:
+            histogram = self.latency[cmd.name] = Histogram()
+
+        histogram.observe(elapsed)
+
+    def handled(self, name, elapsed):
+        histogram = self.handlers.get(name)
+        if histogram is None:
+            histogram = self.handlers[name] = Histogram()
+
+        histogram.observe(elapsed)
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.started
+        return {
+            'uptime': uptime,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'sent': dict(self.sent),
+            'received': dict(self.received),
+            'received_per_second': {
+                name: count / uptime for name, count in self.received.items() if name.startswith('Back')
+            },
+            'latency': {name: histogram.snapshot() for name, histogram in self.latency.items()},
+            'handlers': {name: histogram.snapshot() for name, histogram in self.handlers.items()}
+        }
+
+    def to_prometheus(self, prefix = 'mmkv'):
+        lines = [
+            f'# TYPE {prefix}_uptime_seconds gauge',
+            f'{prefix}_uptime_seconds {time.monotonic() - self.started}',
+            f'# TYPE {prefix}_sent_bytes_total counter',
+            f'{prefix}_sent_bytes_total {self.bytes_sent}',
+            f'# TYPE {prefix}_received_bytes_total counter',
+            f'{prefix}_received_bytes_total {self.bytes_received}'
+        ]
+
+        for metric, counter in (('sent_frames_total', self.sent), ('received_frames_total', self.received)):
+            lines.append(f'# TYPE {prefix}_{metric} counter')
+            lines.extend(f'{prefix}_{metric}{{command="{name}"}} {count}' for name, count in counter.items())
+
+        for metric, label, histograms in (
+            ('request_latency_seconds', 'command', self.latency),
+            ('handler_seconds', 'handler', self.handlers)
+        ):
+            lines.append(f'# TYPE {prefix}_{metric} histogram')
+            for name, histogram in histograms.items():
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(f'{prefix}_{metric}_bucket{{{label}="{name}",le="{le}"}} {count}')
+
+                lines.append(f'{prefix}_{metric}_sum{{{label}="{name}"}} {histogram.sum}')
+                lines.append(f'{prefix}_{metric}_count{{{label}="{name}"}} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+import os
+
+from .exception import MMBDError
+from .priority import Priority
+
+UNIT_SIZE = 6144
+BATCH_UNITS = 32
+
+
+class MMBD:
+    '''
+    Decrypts the stream files of a disc through makemkvcon's MMBD calls. Units are aligned
+    UNIT_SIZE blocks of a file, identified by the name_flags of the file and their offset in it.
+    Decrypted data is copied from the receive buffer straight into caller buffers and up to limit
+    unit requests are kept queued so the guiserver never waits on us between units. The clip_info
+    makemkvcon hands back for a file is kept by name_flags and sent with its later units.
+    '''
+    def __init__(self, makemkv, limit = None, priority = Priority.Background):
+        self.makemkv = makemkv
+        self.limit = limit
+        self.priority = priority
+        self.disc_info = None
+        self.clip_info = {}
+
+    async def open(self, locator: str, flags: int = 0):
+        '''
+        Initializes MMBD and opens locator, a device or path
+        '''
+        status = await self.makemkv.init_mmbd(flags)
+        if status:
+            raise MMBDError(f'CallInitMMBD failed with {status}')
+
+        status = await self.makemkv.open_mmbd(locator, flags)
+        if status:
+            raise MMBDError(f'Could not open {locator}: {status}')
+
+        self.disc_info = await self.makemkv.get_mmbd_disc_info()
+        return self
+
+    async def decrypt(self, name_flags, offset, data, out = None):
+        '''
+        Decrypts the whole units in data, read from offset, into out or in place, or into a new
+        buffer if data is read-only. Returns a memoryview of the decrypted data.
+        '''
+        if offset % UNIT_SIZE:
+            raise ValueError(f'Offset {offset} is not aligned to {UNIT_SIZE}')
+
+        data = memoryview(data).cast('B')
+        if out is None:
+            out = memoryview(bytearray(len(data))) if data.readonly else data
+        else:
+            out = memoryview(out).cast('B')
+        if len(data) % UNIT_SIZE or len(out) < len(data):
+            raise ValueError(f'Data must be whole units of {UNIT_SIZE} bytes and fit into out')
+
+        first = 0
+        clip_info = self.clip_info.get(name_flags, 0)
+        if not clip_info and data:
+            # Learn the file's clip_info from its first unit before queueing the rest with it
+            _, clip_info = await self.makemkv.decrypt_unit_mmbd(
+                name_flags, clip_info, offset, data[:UNIT_SIZE], out[:UNIT_SIZE], self.priority
+            )
+            first = UNIT_SIZE
+
+        results = await self.makemkv.decrypt_units_mmbd(
+            (
+                (name_flags, clip_info, offset + pos, data[pos:pos + UNIT_SIZE], out[pos:pos + UNIT_SIZE])
+                for pos in range(first, len(data), UNIT_SIZE)
+            ),
+            self.limit, self.priority
+        )
+        if results:
+            clip_info = results[-1][1]
+
+        self.clip_info[name_flags] = clip_info
+        return out[:len(data)]
+
+    async def decrypt_range(self, file, name_flags, start = 0, end = None, batch_units = BATCH_UNITS):
+        '''
+        Yields decrypted memoryviews of up to batch_units units of file, a path or a binary file
+        object, from start to end or the end of the file. A trailing partial unit is yielded as
+        read. Each chunk is only valid until the next one is requested; the next batch is read
+        and decrypting while the caller handles the current one.
+        '''
+        if start % UNIT_SIZE:
+            raise ValueError(f'Start {start} is not aligned to {UNIT_SIZE}')
+
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb', buffering=0) as f:
+                async for chunk in self._decrypt_range(f, name_flags, start, end, batch_units):
+                    yield chunk
+        else:
+            async for chunk in self._decrypt_range(file, name_flags, start, end, batch_units):
+                yield chunk
+
+    async def _decrypt_range(self, file, name_flags, start, end, batch_units):
+        loop = asyncio.get_running_loop()
+        size = batch_units * UNIT_SIZE
+        # One batch is handed to the caller while the next is read and decrypted into the other
+        buffers = (memoryview(bytearray(size)), memoryview(bytearray(size)))
+        pending = deque()
+
+        file.seek(start)
+        offset = start
+        current = 0
+
+        try:
+            while True:
+                length = size if end is None else min(size, end - offset)
+                view = buffers[current][:length]
+                read = await loop.run_in_executor(None, file.readinto, view) if length > 0 else 0
+
+                if read:
+                    pending.append(asyncio.ensure_future(self._decrypt_batch(name_flags, offset, view[:read])))
+                    offset += read
+                    current ^= 1
+
+                done = read < length or not read
+                while len(pending) > (0 if done else 1):
+                    yield await pending[0]
+                    pending.popleft()
+
+                if done:
+                    return
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _decrypt_batch(self, name_flags, offset, view):
+        whole = len(view) - len(view) % UNIT_SIZE
+        if whole:
+            await self.decrypt(name_flags, offset, view[:whole])
+
+        return view
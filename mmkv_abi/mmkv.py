@@ -1,32 +1,49 @@
 import asyncio
-from collections import namedtuple
+from collections import deque, namedtuple
 from logging import getLogger
+import os
+import re
 from shutil import which
 import struct
-from subprocess import PIPE, STDOUT
+import time
 import zlib
 
 from .app_string import AppString
+from .backup import BACKUP_DECRYPT, BackupJob
 from .command import Command
-from .drive_info import DriveInfo
-from .exception import ABIVersionMismatch, CommunicationError, MakeMKVNotFound
+from .disc_cache import default_cache_dir
+from .drive_info import DriveInfo, DriveState
+from .exception import (
+    ABIVersionMismatch, CommunicationError, DiscClosed, MakeMKVNotFound, MMBDError, RequestCancelled
+)
 from .item_attribute import ItemAttribute
 from .language_data import LanguageData
+from .metrics import Metrics
+from .priority import Priority
+from .progress import ProgressTracker, SMOOTHING
+from .protocol import ABIProtocol
+from .replay import Recorder
+from .subscription import Subscription
 from .title_tree import TitleList
+from .transport import ProcessConnector
 
 TIMEOUT = 5
+IDLE_INTERVAL = 0.25
+PIPELINE_LIMIT = 64
 ABIResponse = namedtuple('ABIResponse', ('cmd', 'args', 'data'))
+ABIEvent = namedtuple('ABIEvent', ('cmd', 'args', 'data', 'value'))
 
 
 class MakeMKV:
     ABI_VERSION = 'A0001'
-    TRANSPORT = 'std'  # pipe transport
+    TRANSPORT = 'std'  # pipe transport; makemkvcon's shared memory transport is not supported
 
     @staticmethod
     def _32t64(x, y):
         return x + (y << 32)
 
-    def __init__(self, logger = None):
+    def __init__(self, logger = None, idle_interval = IDLE_INTERVAL, cache_dir = None, metrics = False,
+                 connector = None, record = None):
         self.language_data = None
         self.current_info = [None] * 10
         self.job_mode = False
@@ -35,6 +52,30 @@ class MakeMKV:
 
         self.drives = {}
         self.titles = None
+        # The drive id, or path for images and folders, of the disc that is open
+        self.disc = None
+        self.metrics = Metrics() if metrics else None
+
+        self._idle_interval = idle_interval
+        self._cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+        self._record = record
+        self._recorder = None
+        self._transport = None
+        self._protocol = None
+        self._process = None
+        self._pump = None
+        # One queue per Priority
+        self._requests = tuple(deque() for _ in Priority)
+        self._pending = None
+        self._pending_cmd = None
+        self._pending_sent = 0
+        self._last_received = 0
+        self._in_flight = {}
+        # Bumped whenever a disc is closed, requests about its items carry the one they were made in
+        self._generation = 0
+        # Buffers the data of a request's Return is copied into rather than into new bytes
+        self._sinks = {}
+        self._subscribers = set()
 
         if logger is None:
             logger = getLogger(__name__)
@@ -44,41 +85,250 @@ class MakeMKV:
         logger.debug('ABI version: %s', MakeMKV.ABI_VERSION)
         logger.debug('Transport: %s', MakeMKV.TRANSPORT)
 
-        self._exec = which('makemkvcon')
-        logger.debug('makemkvcon: %s', self._exec)
+        if connector is None:
+            self._exec = which('makemkvcon')
+            logger.debug('makemkvcon: %s', self._exec)
 
-        if self._exec is None:
-            raise MakeMKVNotFound()
+            if self._exec is None:
+                raise MakeMKVNotFound()
+
+            connector = ProcessConnector(
+                [self._exec, 'guiserver', f'{MakeMKV.ABI_VERSION}+{MakeMKV.TRANSPORT}']
+            )
+
+        self._connector = connector
 
     async def init(self, load_interface_language_data = True):
-        self._process = await asyncio.create_subprocess_exec(
-            self._exec, 'guiserver', f'{MakeMKV.ABI_VERSION}+{MakeMKV.TRANSPORT}',
-            stdout=PIPE, stderr=STDOUT, stdin=PIPE
+        if self._record is not None:
+            self._recorder = Recorder(self._record)
+
+        self._transport, self._protocol, self._process = await self._connector.connect(
+            lambda: ABIProtocol(
+                self._frame_received, self._connection_lost, len(MakeMKV.ABI_VERSION), self._recorder
+            )
         )
 
-        abi_version = str(await self._process.stdout.read(len(MakeMKV.ABI_VERSION)), 'utf-8')
+        try:
+            abi_version = await asyncio.wait_for(self._protocol.handshake, TIMEOUT)
+        except asyncio.exceptions.TimeoutError:
+            raise CommunicationError()
+
         self.logger.debug('makemkvcon ABI version: %s', abi_version)
 
         if MakeMKV.ABI_VERSION != abi_version:
             raise ABIVersionMismatch()
 
-        stdout = b'\x00'
-        while stdout[-1] != 0xaa:
-            stdout = await self._process.stdout.read(4)
-        
-        self._process.stdin.write(b'\xbb')
-        await self._process.stdin.drain()
+        self._protocol.write_handshake(b'\xbb')
+        await self._protocol.drain()
+
+        self.set_idle_interval(self._idle_interval)
 
         if load_interface_language_data:
             await self.load_interface_language_data()
 
         self._init = True
 
+    async def __aenter__(self):
+        if self._transport is None:
+            await self.init()
+
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.shutdown()
+
+    async def shutdown(self, timeout = TIMEOUT):
+        '''
+        Asks makemkvcon to exit with CallSignalExit, waits up to timeout for it to do so and
+        closes the session
+        '''
+        if self._pump is not None:
+            self._pump.cancel()
+
+        try:
+            await asyncio.wait_for(self._transact(Command.CallSignalExit, priority=Priority.JobControl), timeout)
+
+            if self._process is not None:
+                await asyncio.wait_for(self._process.wait(), timeout)
+        except (CommunicationError, asyncio.exceptions.TimeoutError):
+            self.logger.debug('makemkvcon did not exit on CallSignalExit')
+
+        await self.close()
+
+    async def close(self):
+        if self._pump is not None:
+            self._pump.cancel()
+
+        self._transport.close()
+
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+            await self._process.wait()
+
+        if self._recorder is not None:
+            self._recorder.close()
+
     async def idle(self):
         await self._transact(Command.CallOnIdle)
 
+    def set_idle_interval(self, idle_interval):
+        '''
+        Changes how often CallOnIdle is sent while nothing else is on the wire; None stops it
+        '''
+        self._idle_interval = idle_interval
+
+        if self._pump is not None:
+            self._pump.cancel()
+            self._pump = None
+
+        if idle_interval and self._protocol is not None:
+            self._pump = asyncio.create_task(self._idle_loop())
+
+    def events(self):
+        '''
+        Returns an async iterator of ABIEvents for every back-channel message received from
+        makemkvcon from this call onwards
+        '''
+        return self._subscription(self._iter_events)
+
+    async def _iter_events(self, queue):
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+
+                yield event
+        finally:
+            self._subscribers.discard(queue)
+
+    def progress(self, smoothing = SMOOTHING):
+        '''
+        Returns an async iterator of ProgressEvents for job start and stop, bar updates and
+        changes to the current operation, from this call onwards. smoothing is the time constant
+        in seconds of the smoothed rate the ETAs are based on.
+        '''
+        tracker = ProgressTracker(smoothing, self.current_info[3], self.current_info[4])
+        return self._subscription(self._iter_progress, tracker)
+
+    async def _iter_progress(self, queue, tracker):
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+
+                progress = tracker.update(event)
+                if progress is not None:
+                    yield progress
+        finally:
+            self._subscribers.discard(queue)
+
+    def scan_titles(self):
+        '''
+        Returns an async iterator that yields each Title as soon as makemkvcon has reported all of
+        its tracks and chapters and finishes once the whole title collection is complete
+        '''
+        return self._subscription(self._scan_titles)
+
+    async def _scan_titles(self, queue):
+        titles = self.titles
+        yielded = set()
+
+        def completed(indexes):
+            for index in indexes:
+                title = titles.get_title(index)
+                if index not in yielded and title is not None and title.complete:
+                    yielded.add(index)
+                    yield title
+
+        try:
+            if titles is not None:
+                for title in completed(range(len(titles))):
+                    yield title
+
+                if len(yielded) == len(titles):
+                    return
+
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+
+                if event.cmd is Command.BackSetTitleCollInfo:
+                    if event.value is not titles:
+                        titles = event.value
+                        yielded = set()
+                elif event.cmd in (Command.BackSetTitleInfo, Command.BackSetTrackInfo, Command.BackSetChapterInfo):
+                    for title in completed((event.args[0],)):
+                        yield title
+                else:
+                    continue
+
+                if len(yielded) == len(titles):
+                    return
+        finally:
+            self._subscribers.discard(queue)
+
+    async def wait_for(self, condition, timeout = None):
+        '''
+        Waits until makemkvcon reports the given condition. A DriveState waits for any drive to
+        reach that state and returns its DriveInfo, a Command waits for the next back-channel
+        message of that type and a callable is used as a predicate on each ABIEvent.
+        '''
+        queue = self._subscribe()
+        try:
+            return await asyncio.wait_for(self._wait_for(queue, condition), timeout)
+        finally:
+            self._subscribers.discard(queue)
+
+    async def _wait_for(self, queue, condition):
+        if isinstance(condition, DriveState):
+            for drive_info in self.drives.values():
+                if drive_info.drive_state is condition:
+                    return drive_info
+
+        while True:
+            event = await queue.get()
+            if event is None:
+                raise CommunicationError()
+
+            if isinstance(condition, DriveState):
+                if event.cmd is Command.BackUpdateDrive and event.value is not None and \
+                        event.value.new_state is condition:
+                    return event.value.drive_info
+            elif isinstance(condition, Command):
+                if event.cmd is condition:
+                    return event
+            elif condition(event):
+                return event
+
+    def _subscribe(self):
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        return queue
+
+    def _subscription(self, iterate, *args):
+        queue = self._subscribe()
+        return Subscription(self._subscribers, queue, iterate(queue, *args))
+
+    def _publish(self, event):
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    async def _idle_loop(self):
+        # makemkvcon only flushes back-channel messages while servicing a call, so keep one
+        # CallOnIdle going whenever nothing else is on the wire
+        while True:
+            await asyncio.sleep(self._idle_interval)
+            if self._pending is None and not any(self._requests):
+                try:
+                    await self.idle()
+                except CommunicationError:
+                    return
+
     async def update_avalible_drives(self, flags: int = 0):
-        await self._transact(Command.CallUpdateAvailableDrives, ('<I', flags))
+        await self._transact(Command.CallUpdateAvailableDrives, ('<I', flags), priority=Priority.JobControl)
 
     async def get_app_string(self, key: AppString | int, index_1 = 0, index_2 = 0):
         data = (await self._transact(
@@ -88,10 +338,139 @@ class MakeMKV:
         return str(data, 'utf-8')
     
     async def open_cd_disk(self, index, flags: int = 0):
-        await self._transact(Command.CallOpenCdDisk, ('<I', index), ('<I', flags))
+        '''
+        Opens the disc in drive index, closing the disc that was open before
+        '''
+        if self.disc is not None:
+            await self.close_disc()
+
+        await self._transact(Command.CallOpenCdDisk, ('<I', index), ('<I', flags), priority=Priority.JobControl)
+        self.disc = index
+
+    async def open_file(self, path: str, flags: int = 0):
+        '''
+        Opens a disc image or a BDMV/VIDEO_TS folder, closing the disc that was open before.
+        Returns whether makemkvcon could open it.
+        '''
+        if self.disc is not None:
+            await self.close_disc()
+
+        res = await self._transact(
+            Command.CallOpenFile, ('<I', flags), data=bytes(path, 'utf-8') + b'\x00', priority=Priority.JobControl
+        )
+        self.disc = path
+        return self._opened(res)
+
+    async def open_title_collection(self, source: str, flags: int = 0):
+        '''
+        Opens a title collection by makemkvcon source name, e.g. 'iso:/path/disc.iso',
+        'file:/path/BDMV' or 'disc:0', closing the disc that was open before. Returns whether
+        makemkvcon could open it.
+        '''
+        if self.disc is not None:
+            await self.close_disc()
+
+        res = await self._transact(
+            Command.CallOpenTitleCollection, ('<I', flags), data=bytes(source, 'utf-8') + b'\x00',
+            priority=Priority.JobControl
+        )
+        self.disc = source
+        return self._opened(res)
 
-    async def get_ui_item_info(self, handle, item_attribute: ItemAttribute):
-        res = await self._transact(Command.CallGetUiItemInfo, ('<Q', handle), ('<I', item_attribute.value))
+    @staticmethod
+    def _opened(res):
+        # The open calls return a boolean; a bare Return carries no verdict
+        return not res.args or res.args[0] != 0
+
+    async def close_disc(self, flags: int = 0):
+        '''
+        Closes the open disc so the session can be used for the next one. The old title tree is
+        detached and nothing looked up for it is shared with later requests.
+        '''
+        self._forget_disc()
+        await self._transact(Command.CallCloseDisk, ('<I', flags), priority=Priority.JobControl)
+
+    async def eject(self, drive_id):
+        '''
+        Ejects the disc in drive_id, closing it first if it is the open one
+        '''
+        if self.disc == drive_id:
+            await self.close_disc()
+
+        await self._transact(Command.CallEjectDisk, ('<I', drive_id), priority=Priority.JobControl)
+
+    def _forget_disc(self):
+        if self.titles is not None:
+            self.titles.detach()
+
+        self.titles = None
+        self.disc = None
+        # Item handles are only unique within a disc
+        self._in_flight.clear()
+        self._generation += 1
+
+        for queue in self._requests:
+            for _, _, _, future, generation in queue:
+                if generation is not None and not future.done():
+                    future.set_exception(DiscClosed())
+
+    async def get_ui_item_info(self, handle, item_attribute: ItemAttribute, priority = Priority.Interactive):
+        res = await self._transact_shared(
+            ('info', handle, item_attribute.value),
+            Command.CallGetUiItemInfo, ('<Q', handle), ('<I', item_attribute.value), priority=priority
+        )
+        return self._decode_ui_item_info(res)
+
+    async def get_ui_item_infos(self, items, limit = None, priority = Priority.Interactive):
+        '''
+        Fetches a list of (handle, ItemAttribute) pairs back-to-back without waiting on each reply
+        in between, keeping at most limit requests queued, and returns the values in the same order
+        '''
+        responses = await self._pipeline(
+            ((('info', handle, item_attribute.value),
+              Command.CallGetUiItemInfo, ('<Q', handle), ('<I', item_attribute.value))
+             for handle, item_attribute in items),
+            limit, priority
+        )
+        return [self._decode_ui_item_info(res) for res in responses]
+
+    async def _pipeline(self, requests, limit = None, priority = Priority.Interactive):
+        '''
+        Submits (key, cmd, *args) requests back-to-back, keeping at most limit queued, and returns
+        the responses in the same order. Requests with a key are shared as in _transact_shared.
+        The requests are about the open disc's items, so this raises DiscClosed once it is closed.
+        '''
+        if limit is None:
+            limit = PIPELINE_LIMIT
+
+        generation = self._generation
+        responses = []
+        window = deque()
+
+        try:
+            for key, cmd, *args in requests:
+                if len(window) >= limit:
+                    responses.append(await self._wait_flight(window.popleft()))
+
+                if self._generation != generation:
+                    raise DiscClosed()
+
+                if key is not None:
+                    window.append(self._join(key, cmd, *args, priority=priority))
+                else:
+                    window.append(
+                        [self._submit(cmd, *args, priority=priority, generation=generation), 1, priority]
+                    )
+
+            while window:
+                responses.append(await self._wait_flight(window.popleft()))
+        finally:
+            for flight in window:
+                self._release(flight)
+
+        return responses
+
+    def _decode_ui_item_info(self, res):
         if res.args[0] != 0:
             if self.language_data is None:
                 self.logger.warn('Language data not loaded; returning raw index')
@@ -101,7 +480,36 @@ class MakeMKV:
         elif res.args[1] != 0:
             return str(res.data[:-1], 'utf-8')
 
-    async def load_interface_language_data(self):
+    async def load_interface_language_data(self, use_cache = True):
+        '''
+        Loads the interface strings. With use_cache the decompressed data is kept in the cache
+        directory per MakeMKV version and interface language and mapped from there next time.
+        '''
+        path = None
+        if use_cache and self._cache_dir:
+            version = await self.get_app_string(AppString.Version)
+            language = await self.get_app_string(AppString.InterfaceLanguage)
+            name = re.sub(r'[^\w.-]', '_', f'{version}-{language}'.replace('\x00', ''))
+            path = os.path.join(self._cache_dir, f'language-{name}.bin')
+
+            try:
+                start = time.perf_counter()
+                self.language_data = LanguageData.from_file(path)
+                if self.metrics is not None:
+                    self.metrics.handled('LanguageData', time.perf_counter() - start)
+
+                self.logger.debug('Language data loaded from %s', path)
+                return
+            except OSError as e:
+                self.logger.debug('Language data not cached: %s', e)
+            except (ValueError, struct.error) as e:
+                # Truncated or corrupt; drop it so it is downloaded and cached again below
+                self.logger.warning('Discarding cached language data %s: %s', path, e)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
         # AP_APP_LOC_MAX = 7000
         res = await self._transact(Command.CallGetInterfaceLanguageData, ('<I', 7000))
         unpacked_size, packed_size = res.args
@@ -110,116 +518,401 @@ class MakeMKV:
         if len(packed_data) != packed_size:
             raise RuntimeError('Packed language data does not match expected size')
         
+        start = time.perf_counter()
         unpacked_data = zlib.decompress(packed_data, bufsize=unpacked_size)
         if len(unpacked_data) != unpacked_size:
             raise RuntimeError('Unpacked language data does not match expected size')
 
         self.language_data = LanguageData(unpacked_data)
-
-    async def get_ui_item_state(self, handle):
-        res = await self._transact(Command.CallGetUiItemState, ('<Q', handle))
+        if self.metrics is not None:
+            self.metrics.handled('LanguageData', time.perf_counter() - start)
+
+        if path is not None:
+            try:
+                os.makedirs(self._cache_dir, exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(unpacked_data)
+
+                os.replace(path + '.tmp', path)
+            except OSError as e:
+                self.logger.warning('Unable to cache language data: %s', e)
+
+    async def get_ui_item_state(self, handle, priority = Priority.Interactive):
+        res = await self._transact_shared(
+            ('state', handle), Command.CallGetUiItemState, ('<Q', handle), priority=priority
+        )
         return res.args[0]
     
     async def set_ui_item_state(self, handle, state):
-        await self._transact(Command.CallSetUiItemState, ('<Q', handle), ('<I', state))
+        # A read already on the wire answers with the old state, don't let new callers join it
+        self._in_flight.pop(('state', handle), None)
+        await self._transact(
+            Command.CallSetUiItemState, ('<Q', handle), ('<I', state), generation=self._generation
+        )
+
+    async def get_ui_item_states(self, handles, limit = None, priority = Priority.Interactive):
+        '''
+        Pipelined get_ui_item_state for a list of handles
+        '''
+        responses = await self._pipeline(
+            ((('state', handle), Command.CallGetUiItemState, ('<Q', handle)) for handle in handles),
+            limit, priority
+        )
+        return [res.args[0] for res in responses]
+
+    async def set_ui_item_states(self, states, limit = None):
+        '''
+        Pipelined set_ui_item_state for a list of (handle, state) pairs
+        '''
+        states = list(states)
+        for handle, _ in states:
+            self._in_flight.pop(('state', handle), None)
+
+        await self._pipeline(
+            ((None, Command.CallSetUiItemState, ('<Q', handle), ('<I', state)) for handle, state in states), limit
+        )
 
     async def set_output_folder(self, folder: str):
-        await self._transact(Command.CallSetOutputFolder, data=bytes(folder, 'utf-8') + b'\x00')
+        await self._transact(
+            Command.CallSetOutputFolder, data=bytes(folder, 'utf-8') + b'\x00', priority=Priority.JobControl
+        )
 
     async def save_all_selected_to_mkv(self):
-        await self._transact(Command.CallSaveAllSelectedTitlesToMkv)
+        await self._transact(Command.CallSaveAllSelectedTitlesToMkv, priority=Priority.JobControl)
+
+    async def backup_disc(self, drive_id, destination: str, decrypt = True, hash_name = 'sha256', workers = None):
+        '''
+        Starts a full backup of the disc in drive_id to destination and returns its BackupJob,
+        which streams the job's progress and hashes the backed up files with workers threads as
+        they are completed
+        '''
+        job = BackupJob(self, destination, hash_name, workers, logger=self.logger)
+        try:
+            await self._transact(
+                Command.CallBackupDisc, ('<I', drive_id), ('<I', BACKUP_DECRYPT if decrypt else 0),
+                data=bytes(destination, 'utf-8') + b'\x00', priority=Priority.JobControl
+            )
+        except BaseException:
+            await job.cancel()
+            raise
+
+        job.start(self.job_mode)
+        return job
+
+    async def init_mmbd(self, flags: int = 0):
+        '''
+        Returns the status word of CallInitMMBD
+        '''
+        res = await self._transact(Command.CallInitMMBD, ('<I', flags), priority=Priority.JobControl)
+        return res.args[0] if res.args else 0
+
+    async def open_mmbd(self, locator: str, flags: int = 0):
+        '''
+        Opens a disc for decryption, locator is a device or path as accepted by libmmbd. Returns
+        the status word of CallOpenMMBD.
+        '''
+        res = await self._transact(
+            Command.CallOpenMMBD, ('<I', flags), data=bytes(locator, 'utf-8') + b'\x00', priority=Priority.JobControl
+        )
+        return res.args[0] if res.args else 0
+
+    async def get_mmbd_disc_info(self):
+        '''
+        Returns the raw disc info block of the disc opened with open_mmbd
+        '''
+        return (await self._transact(Command.CallDiscInfoMMBD)).data
+
+    async def decrypt_unit_mmbd(self, name_flags, clip_info, offset, unit, into = None,
+                                priority = Priority.Background):
+        '''
+        Decrypts one aligned unit of a stream file. unit is any bytes-like object and the result
+        is copied straight from the receive buffer into into, a writable buffer which defaults to
+        unit itself when that is writable and to a new one otherwise. clip_info is the per-file
+        value libmmbd's mmbd_decrypt_unit takes and updates, 0 for a file's first unit. Returns
+        the decrypted memoryview and the updated clip_info.
+        '''
+        return (await self.decrypt_units_mmbd(((name_flags, clip_info, offset, unit, into),), 1, priority))[0]
+
+    async def decrypt_units_mmbd(self, units, limit = None, priority = Priority.Background):
+        '''
+        Decrypts (name_flags, clip_info, offset, unit, into) units back-to-back, keeping at most
+        limit requests queued, and returns (memoryview, clip_info) pairs in the same order. into
+        may be None to decrypt in place, or into a new buffer if unit is read-only.
+
+        The request mirrors mmbd_decrypt_unit(name_flags, &clip_info, offset, buf) as name_flags,
+        clip_info and offset followed by the unit, and the updated clip_info is read from args 1
+        and 2 of the Return when it has them. This layout is not verified against makemkvcon.
+        '''
+        if limit is None:
+            limit = PIPELINE_LIMIT
+
+        results = []
+        window = deque()
+
+        async def wait():
+            future, size, clip_info = window.popleft()
+            res = await self._wait_response(future)
+            if len(res.data) != size:
+                raise MMBDError(f'Decrypted {len(res.data)} of {size} bytes')
+
+            if len(res.args) >= 3:
+                clip_info = self._32t64(res.args[1], res.args[2])
+
+            results.append((res.data, clip_info))
 
-    async def _transact(self, cmd: Command, *args,  data: bytes = b''):
-        await self._send_cmd(cmd, *args, data=data)
-        return await self._recv_cmd()
+        try:
+            for name_flags, clip_info, offset, unit, into in units:
+                if len(window) >= limit:
+                    await wait()
+
+                if into is None:
+                    into = bytearray(len(unit)) if memoryview(unit).readonly else unit
+
+                future = self._submit(
+                    Command.CallDecryptUnitMMBD, ('<I', name_flags), ('<Q', clip_info), ('<Q', offset),
+                    data=unit, priority=priority, into=into
+                )
+                window.append((future, len(unit), clip_info))
+
+            while window:
+                await wait()
+        finally:
+            for future, _, _ in window:
+                future.cancel()
+
+        return results
+
+    def cancel_queued(self, priority = Priority.Background):
+        '''
+        Fails every request of the given priority class or lower that has not been sent yet with
+        RequestCancelled and returns how many there were
+        '''
+        # Shared requests that were promoted to a higher class stay queued there
+        promoted = {id(future) for queue in self._requests[:priority] for _, _, _, future, _ in queue}
+
+        count = 0
+        for queue in self._requests[priority:]:
+            while queue:
+                future = queue.popleft()[3]
+                if not future.done() and id(future) not in promoted:
+                    future.set_exception(RequestCancelled())
+                    count += 1
+
+        return count
+
+    async def _transact(self, cmd: Command, *args,  data: bytes = b'', priority = Priority.Interactive,
+                        generation = None):
+        return await self._wait_response(
+            self._submit(cmd, *args, data=data, priority=priority, generation=generation)
+        )
 
-    async def _send_cmd(self, cmd: Command, *args, data: bytes = b''):
-        buffer = b''
+    async def _transact_shared(self, key, cmd: Command, *args, priority = Priority.Interactive):
+        '''
+        Like _transact, but concurrent callers with the same key share one request rather than
+        each sending their own
+        '''
+        return await self._wait_flight(self._join(key, cmd, *args, priority=priority))
+
+    def _join(self, key, cmd: Command, *args, priority = Priority.Interactive):
+        '''
+        Returns the [future, waiter count, priority] of the request in flight for key, submitting
+        one if there is none. Each call must be paired with a _release once the caller stops
+        waiting. Keys name items of the open disc, so the request belongs to its generation.
+        '''
+        flight = self._in_flight.get(key)
+        if flight is None or flight[0].done():
+            future = self._submit(cmd, *args, priority=priority, generation=self._generation)
+            flight = self._in_flight[key] = [future, 0, priority]
+            future.add_done_callback(lambda future: self._landed(key, flight))
+        elif priority < flight[2]:
+            # Queue it again at the higher priority, whichever copy is reached second is skipped
+            # since its future is done by then
+            self._requests[priority].append((cmd, args, b'', flight[0], self._generation))
+            flight[2] = priority
+
+        flight[1] += 1
+        return flight
+
+    def _release(self, flight):
+        # The request is only cancelled once nobody is waiting on it anymore
+        flight[1] -= 1
+        if flight[1] == 0:
+            flight[0].cancel()
+
+    def _landed(self, key, flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    async def _wait_flight(self, flight):
+        try:
+            return await self._wait_response(flight[0], cancel=False)
+        finally:
+            self._release(flight)
 
-        for format, arg in args:
-            buffer += struct.pack(format, arg)
+    def _submit(self, cmd: Command, *args, data: bytes = b'', priority = Priority.Interactive, into = None,
+                generation = None):
+        if into is not None:
+            sink = memoryview(into).cast('B')
+            if sink.readonly:
+                # Checked here, since failing in _frame_received would take the connection down
+                raise ValueError('Responses can only be received into writable buffers')
 
-        buffer = struct.pack('<HBB', len(data), int(len(buffer) / 4), cmd.value) + buffer + data
+        future = asyncio.get_running_loop().create_future()
+        self._requests[priority].append((cmd, args, data, future, generation))
 
-        self.logger.debug('Sending: %s', buffer)
-        self._process.stdin.write(buffer)
-        await self._process.stdin.drain()
+        if into is not None:
+            self._sinks[future] = sink
+            future.add_done_callback(self._drop_sink)
 
-    async def _recv_cmd(self):
-        while True:
-            response = await self._unpack_received(self._process.stdout)
-            if response is None:
-                return None
+        if self._pending is None:
+            self._send_next()
 
-            cmd, args, data = response
-            ack_args = ()
-
-            if cmd is Command.Nop:
-                pass
-            elif cmd is Command.BackUpdateDrive:
-                drive_info = DriveInfo.from_update(args, data)
-                if drive_info is not None:
-                    self.drives[args[0]] = drive_info
-            elif cmd is Command.BackSetTitleCollInfo:
-                handle = self._32t64(args[0], args[1])
-                self.titles = TitleList(args[2], self, handle)
-            elif cmd is Command.BackSetTitleInfo:
-                handle = self._32t64(args[1], args[2])
-                chapter_handle = self._32t64(args[5], args[6])
-                self.titles.add_title(args[0], handle, chapter_handle, args[4], args[3])
-            elif cmd is Command.BackSetTrackInfo:
-                handle = self._32t64(args[2], args[3])
-                self.titles.get_title(args[0]).add_track(args[1], handle)
-            elif cmd is Command.BackSetChapterInfo:
-                handle = self._32t64(args[2], args[3])
-                self.titles.get_title(args[0]).chapters.add_chapter(args[1], handle)
-            elif cmd is Command.BackUpdateCurrentInfo:
-                # TODO: Handle other cases
-                if args[0] < 10:
-                    self.current_info[args[0]] = str(data[:-1], 'utf-8')
-            elif cmd is Command.BackEnterJobMode:
-                self.job_mode = True
-            elif cmd is Command.BackLeaveJobMode:
-                self.job_mode = False
-            elif cmd is Command.BackUpdateCurrentBar:
-                self.current_bar = args[0]
-            elif cmd is Command.BackUpdateTotalBar:
-                self.total_bar = args[0]
-            elif cmd is Command.Return:
-                return ABIResponse(cmd, args, data)
-
-            await self._send_cmd(Command.ClientDone, *ack_args)
-
-    async def _unpack_received(self, stream):
-        try:
-            buffer = await asyncio.wait_for(stream.read(4), TIMEOUT)
-            self.logger.debug('Received: %s', buffer)
-        except asyncio.exceptions.TimeoutError:
-            raise CommunicationError()
+        return future
 
-        if len(buffer) == 4:
-            data_size, arg_len, cmd = struct.unpack('<HBB', buffer)
-            cmd = Command(cmd)
-        elif len(buffer) == 1:
-            cmd = int.from_bytes(buffer, 'little')
-            if cmd < 0xf0:
-                raise RuntimeError('Received invalid command')
-                
-            data_size = arg_len = 0
-            cmd = Command(int.from_bytes(buffer, 'little') - 0xf0)
-
-        self.logger.debug('Received cmd: %s', cmd)
-        self.logger.debug('Received arg length: %d', arg_len)
-        self.logger.debug('Received data size: %d', data_size)
-        
-        args = [struct.unpack('<I', await stream.readexactly(4))[0] for _ in range(arg_len)]
-        self.logger.debug('Received args: %s', args)
+    def _drop_sink(self, future):
+        self._sinks.pop(future, None)
 
+    async def _wait_response(self, future, cancel = True):
         try:
-            data = await asyncio.wait_for(stream.readexactly(data_size), 1)
-        except asyncio.exceptions.TimeoutError:
-            raise CommunicationError()
-
-        self.logger.debug('Received data: %s', data)
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), TIMEOUT)
+                except asyncio.exceptions.TimeoutError:
+                    if asyncio.get_running_loop().time() - self._last_received >= TIMEOUT:
+                        raise CommunicationError()
+        except asyncio.CancelledError:
+            if cancel:
+                future.cancel()
+            raise
+
+    def _send_next(self):
+        for queue in self._requests:
+            while queue:
+                cmd, args, data, future, generation = queue.popleft()
+                if future.done():
+                    continue
+
+                if generation is not None and generation != self._generation:
+                    # Its handles may name an item of the disc opened since
+                    future.set_exception(DiscClosed())
+                    continue
+
+                self._pending = future
+                self._pending_cmd = cmd
+                self._last_received = asyncio.get_running_loop().time()
+                self._write_cmd(cmd, *args, data=data)
+
+                if self.metrics is not None:
+                    self._pending_sent = time.perf_counter()
+
+                return
+
+    def _write_cmd(self, cmd: Command, *args, data: bytes = b''):
+        self.logger.debug('Sending cmd: %s, args: %s, data size: %d', cmd, args, len(data))
+        size = self._protocol.write_frame(cmd, args, data)
+
+        if self.metrics is not None:
+            self.metrics.frame_sent(cmd, size)
+
+    def _frame_received(self, cmd, args, data):
+        self._last_received = asyncio.get_running_loop().time()
+        self.logger.debug('Received cmd: %s, args: %s, data size: %d', cmd, args, len(data))
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.frame_received(cmd, 4 + 4 * len(args) + len(data))
+
+        if cmd is Command.Return:
+            future, self._pending = self._pending, None
+            if metrics is not None and future is not None:
+                metrics.response_received(self._pending_cmd, time.perf_counter() - self._pending_sent)
+
+            if future is not None and not future.done():
+                sink = self._sinks.pop(future, None)
+                if sink is None or len(data) > len(sink):
+                    future.set_result(ABIResponse(cmd, args, bytes(data)))
+                else:
+                    try:
+                        sink[:len(data)] = data
+                    except (TypeError, ValueError, BufferError) as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(ABIResponse(cmd, args, sink[:len(data)]))
+
+            self._send_next()
+            return
+
+        data = bytes(data)
+        if metrics is None:
+            value = self._handle_back(cmd, args, data)
+        else:
+            start = time.perf_counter()
+            value = self._handle_back(cmd, args, data)
+            metrics.handled(cmd.name, time.perf_counter() - start)
+
+        self._write_cmd(Command.ClientDone)
+        self._publish(ABIEvent(cmd, args, data, value))
+
+    def _connection_lost(self, exc):
+        self.logger.debug('Connection lost: %s', exc)
+        self._shutdown()
+
+    def _shutdown(self):
+        futures = [f for queue in self._requests for _, _, _, f, _ in queue]
+        if self._pending is not None:
+            futures.append(self._pending)
+
+        for queue in self._requests:
+            queue.clear()
+        self._pending = None
+
+        for future in futures:
+            if not future.done():
+                future.set_exception(CommunicationError())
+
+        self._publish(None)
+
+    def _handle_back(self, cmd, args, data):
+        if cmd is Command.BackUpdateDrive:
+            if len(data) == 0:
+                return None
 
-        return (cmd, args, data)
+            drive_info = self.drives.get(args[0])
+            if drive_info is None:
+                drive_info = self.drives[args[0]] = DriveInfo()
+
+            return drive_info.update(args, data)
+        elif cmd is Command.BackSetTitleCollInfo:
+            handle = self._32t64(args[0], args[1])
+            if self.titles is not None:
+                self.titles.detach()
+
+            self.titles = TitleList(args[2], self, handle)
+            return self.titles
+        elif cmd is Command.BackSetTitleInfo:
+            handle = self._32t64(args[1], args[2])
+            chapter_handle = self._32t64(args[5], args[6])
+            return self.titles.add_title(args[0], handle, chapter_handle, args[4], args[3])
+        elif cmd is Command.BackSetTrackInfo:
+            handle = self._32t64(args[2], args[3])
+            return self.titles.get_title(args[0]).add_track(args[1], handle)
+        elif cmd is Command.BackSetChapterInfo:
+            handle = self._32t64(args[2], args[3])
+            return self.titles.get_title(args[0]).add_chapter(args[1], handle)
+        elif cmd is Command.BackUpdateCurrentInfo:
+            # TODO: Handle other cases
+            if args[0] < 10:
+                self.current_info[args[0]] = str(data[:-1], 'utf-8')
+                return self.current_info[args[0]]
+        elif cmd is Command.BackEnterJobMode:
+            self.job_mode = True
+            return True
+        elif cmd is Command.BackLeaveJobMode:
+            self.job_mode = False
+            return False
+        elif cmd is Command.BackUpdateCurrentBar:
+            self.current_bar = args[0]
+            return self.current_bar
+        elif cmd is Command.BackUpdateTotalBar:
+            self.total_bar = args[0]
+            return self.total_bar
@@ -0,0 +1,194 @@
+import asyncio
+from collections import namedtuple
+from logging import getLogger
+
+from .command import Command
+from .drive_info import DriveState
+from .mmkv import MakeMKV
+from .subscription import Subscription
+
+DriveEvent = namedtuple('DriveEvent', ('drive_id', 'event'))
+
+
+class MakeMKVPool:
+    '''
+    Runs one makemkvcon guiserver per drive. A discovery session watches BackUpdateDrive and
+    whenever a disc is inserted the pool runs job(makemkv, drive_info) on that drive's session,
+    starting one if needed. Jobs on different drives run concurrently. After a job its disc is
+    closed and the session is kept for the next disc in the drive; a session whose job failed is
+    replaced. At most max_sessions sessions are kept, idle ones are closed to make room for a
+    drive that has none.
+    '''
+    def __init__(self, job, logger = None, max_sessions = None, session_factory = MakeMKV):
+        self.sessions = {}
+        self.jobs = {}
+        self.results = {}
+
+        if logger is None:
+            logger = getLogger(__name__)
+
+        self.logger = logger
+
+        self._job = job
+        self._session_factory = session_factory
+        self._max_sessions = max_sessions or None
+        self._limit = asyncio.Semaphore(max_sessions) if max_sessions else None
+        self._running = set()
+        self._discovery = None
+        self._watcher = None
+        self._forwarders = {}
+        self._handled = set()
+        self._subscribers = set()
+
+    async def start(self):
+        self._discovery = self._session_factory(self.logger)
+        await self._discovery.init(load_interface_language_data=False)
+
+        self._watcher = asyncio.create_task(self._watch(self._discovery.events()))
+        await self._discovery.update_avalible_drives()
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+        for task in self.jobs.values():
+            task.cancel()
+
+        await asyncio.gather(*self.jobs.values(), return_exceptions=True)
+
+        for drive_id in list(self.sessions):
+            await self._close_session(drive_id)
+
+        if self._discovery is not None:
+            await self._discovery.close()
+
+        self._publish(None)
+
+    async def join(self):
+        '''
+        Waits for the jobs that are currently running
+        '''
+        await asyncio.gather(*self.jobs.values(), return_exceptions=True)
+
+    def progress(self):
+        '''
+        Returns {drive_id: (current_bar, total_bar, current_info)} for every drive with a session
+        '''
+        return {
+            drive_id: (session.current_bar, session.total_bar, list(session.current_info))
+            for drive_id, session in self.sessions.items()
+        }
+
+    def events(self):
+        '''
+        Returns an async iterator of DriveEvents for every back-channel message received by any
+        drive's session
+        '''
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        return Subscription(self._subscribers, queue, self._iter_events(queue))
+
+    async def _iter_events(self, queue):
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+
+                yield event
+        finally:
+            self._subscribers.discard(queue)
+
+    def _publish(self, event):
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    async def _watch(self, events):
+        for drive_info in list(self._discovery.drives.values()):
+            self._drive_updated(drive_info)
+
+        async for event in events:
+            if event.cmd is Command.BackUpdateDrive and event.value is not None:
+                self._drive_updated(event.value.drive_info)
+
+    def _drive_updated(self, drive_info):
+        drive_id = drive_info.drive_id
+
+        if drive_info.drive_state is not DriveState.Inserted:
+            # The disc is gone; the next one inserted gets a job of its own
+            self._handled.discard(drive_id)
+            return
+
+        if drive_id in self._handled or drive_id in self.jobs:
+            return
+
+        self._handled.add(drive_id)
+        self.jobs[drive_id] = asyncio.create_task(self._run_job(drive_info))
+
+    async def _run_job(self, drive_info):
+        drive_id = drive_info.drive_id
+
+        try:
+            if self._limit is not None:
+                await self._limit.acquire()
+
+            self._running.add(drive_id)
+            try:
+                session = self.sessions.get(drive_id)
+                if session is None:
+                    await self._close_idle()
+                    session = await self._open_session(drive_id)
+
+                self.results[drive_id] = await self._job(session, drive_info)
+                await session.close_disc()
+            except BaseException:
+                # Whatever state it was left in, the next disc starts from a clean session
+                await self._close_session(drive_id)
+                raise
+            finally:
+                self._running.discard(drive_id)
+                if self._limit is not None:
+                    self._limit.release()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.exception('Job for drive %d failed', drive_id)
+            self.results[drive_id] = e
+        finally:
+            del self.jobs[drive_id]
+
+    async def _open_session(self, drive_id):
+        session = self._session_factory(self.logger)
+        await session.init()
+
+        self.sessions[drive_id] = session
+        self._forwarders[drive_id] = asyncio.create_task(self._forward(drive_id, session.events()))
+
+        await session.update_avalible_drives()
+        if drive_id not in session.drives:
+            await session.wait_for(lambda event: drive_id in session.drives)
+
+        return session
+
+    async def _close_idle(self):
+        # This job holds one of the max_sessions slots, so while there are max_sessions sessions
+        # at least one of them is not running a job
+        while self._max_sessions is not None and len(self.sessions) >= self._max_sessions:
+            drive_id = next((drive_id for drive_id in self.sessions if drive_id not in self._running), None)
+            if drive_id is None:
+                return
+
+            await self._close_session(drive_id)
+
+    async def _close_session(self, drive_id):
+        forwarder = self._forwarders.pop(drive_id, None)
+        if forwarder is not None:
+            forwarder.cancel()
+
+        session = self.sessions.pop(drive_id, None)
+        if session is not None:
+            await session.close()
+
+    async def _forward(self, drive_id, events):
+        async for event in events:
+            self._publish(DriveEvent(drive_id, event))
@@ -0,0 +1,11 @@
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    '''
+    Request classes for the command scheduler. Queued requests of a lower value are sent first,
+    requests of the same class in the order they were made.
+    '''
+    Interactive = 0
+    JobControl = 1
+    Background = 2
@@ -0,0 +1,146 @@
+from collections import namedtuple
+from enum import Enum
+import math
+import time
+
+from .command import Command
+
+BAR_MAX = 65536
+SMOOTHING = 5.0
+
+
+class ProgressKind(Enum):
+    JobStarted = 0
+    JobFinished = 1
+    Bar = 2
+    Info = 3
+
+
+ProgressEvent = namedtuple('ProgressEvent', (
+    'kind', 'elapsed', 'current', 'total', 'current_info', 'total_info', 'rate', 'smoothed_rate',
+    'title_eta', 'job_eta', 'phases'
+))
+ProgressEvent.__doc__ = '''
+current and total are the current operation's and the whole job's progress as fractions, rate
+and smoothed_rate the job's progress per second, and title_eta and job_eta the seconds left or
+None while unknown. phases maps each current operation (current_info) seen during the job to the
+seconds spent in it and elapsed is the time since the job started.
+'''
+
+
+class _Rate:
+    '''
+    Progress per second of one bar, instantaneous and as an exponentially weighted moving average
+    with a time constant of smoothing seconds
+    '''
+    __slots__ = ('smoothing', 'value', 'time', 'rate', 'smoothed')
+
+    def __init__(self, smoothing):
+        self.smoothing = smoothing
+        self.reset(0.0, None)
+
+    def reset(self, value, now):
+        self.value = value
+        self.time = now
+        self.rate = None
+        self.smoothed = None
+
+    def update(self, value, now):
+        if self.time is None or value < self.value:
+            # First sample, or the bar started over for the next title
+            self.reset(value, now)
+            return
+
+        elapsed = now - self.time
+        if elapsed <= 0:
+            return
+
+        self.rate = (value - self.value) / elapsed
+        if self.smoothed is None:
+            self.smoothed = self.rate
+        else:
+            self.smoothed += (1 - math.exp(-elapsed / self.smoothing)) * (self.rate - self.smoothed)
+
+        self.value = value
+        self.time = now
+
+    def eta(self):
+        if not self.smoothed or self.smoothed <= 0:
+            return None
+
+        return (1 - self.value) / self.smoothed
+
+
+class ProgressTracker:
+    '''
+    Turns BackEnterJobMode, BackLeaveJobMode, BackUpdateCurrentBar, BackUpdateTotalBar and
+    BackUpdateCurrentInfo events into ProgressEvents
+    '''
+    def __init__(self, smoothing = SMOOTHING, current_info = None, total_info = None, clock = time.monotonic):
+        self._clock = clock
+        self._current = _Rate(smoothing)
+        self._total = _Rate(smoothing)
+        self._current_info = current_info
+        self._total_info = total_info
+        self._started = None
+        self._phase_started = None
+        self._phases = {}
+
+    def update(self, event):
+        '''
+        Returns the ProgressEvent for an ABIEvent, or None if it has nothing to do with progress
+        '''
+        now = self._clock()
+        cmd = event.cmd
+
+        if cmd is Command.BackEnterJobMode:
+            self._current.reset(0.0, now)
+            self._total.reset(0.0, now)
+            self._started = now
+            self._phases = {}
+            self._phase_started = now
+            kind = ProgressKind.JobStarted
+        elif cmd is Command.BackLeaveJobMode:
+            self._end_phase(now)
+            kind = ProgressKind.JobFinished
+        elif cmd is Command.BackUpdateCurrentBar:
+            self._current.update(event.args[0] / BAR_MAX, now)
+            kind = ProgressKind.Bar
+        elif cmd is Command.BackUpdateTotalBar:
+            self._total.update(event.args[0] / BAR_MAX, now)
+            kind = ProgressKind.Bar
+        elif cmd is Command.BackUpdateCurrentInfo and event.args[0] in (3, 4):
+            if event.args[0] == 3:
+                if event.value != self._current_info:
+                    self._end_phase(now)
+                    self._phase_started = now
+
+                self._current_info = event.value
+            else:
+                self._total_info = event.value
+
+            kind = ProgressKind.Info
+        else:
+            return None
+
+        if self._started is None:
+            # Subscribed in the middle of a job
+            self._started = self._phase_started = now
+
+        phases = dict(self._phases)
+        if kind is not ProgressKind.JobFinished and self._current_info is not None:
+            phases[self._current_info] = phases.get(self._current_info, 0) + now - self._phase_started
+
+        return ProgressEvent(
+            kind, now - self._started, self._current.value, self._total.value, self._current_info,
+            self._total_info, self._total.rate, self._total.smoothed, self._current.eta(), self._total.eta(),
+            phases
+        )
+
+    def _end_phase(self, now):
+        if self._current_info is not None and self._phase_started is not None:
+            self._phases[self._current_info] = (
+                self._phases.get(self._current_info, 0) + now - self._phase_started
+            )
+
+        self._phase_started = now
@@ -0,0 +1,243 @@
+import asyncio
+import struct
+
+from .command import Command
+
+SERVER = 0
+CLIENT = 1
+
+HEADER = struct.Struct('<HBB')
+HANDSHAKE_END = 0xaa
+SHORT_CMD_BASE = 0xf0
+
+# Largest frame is a 64 KiB payload plus 255 arguments, so this always fits at least one
+BUFFER_SIZE = 256 * 1024
+SEND_BUFFER_SIZE = 4096
+
+_ARGS = [struct.Struct(f'<{i}I') for i in range(256)]
+_ENCODERS = {}
+
+
+def get_encoder(cmd: Command, formats: tuple):
+    '''
+    Returns a precompiled struct for the header and arguments of cmd along with the argument
+    count in 32-bit words
+    '''
+    key = (cmd._value_, formats)
+    encoder = _ENCODERS.get(key)
+
+    if encoder is None:
+        args = ''.join(format.lstrip('<') for format in formats)
+        encoder = (struct.Struct('<HBB' + args), struct.calcsize('<' + args) // 4, cmd._value_)
+        _ENCODERS[key] = encoder
+
+    return encoder
+
+
+class ABIProtocol(asyncio.BufferedProtocol):
+    '''
+    Decodes the framed std transport in place. makemkvcon writes straight into a reusable
+    receive buffer and complete frames are handed to frame_received as (cmd, args, data), where
+    data is a memoryview into that buffer which is only valid for the duration of the call.
+    '''
+    def __init__(self, frame_received, connection_lost, abi_version_size = 5, recorder = None):
+        self._frame_received = frame_received
+        self._connection_lost = connection_lost
+        self._abi_version_size = abi_version_size
+        self.recorder = recorder
+
+        self._buffer = bytearray(BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+        self.handshake = asyncio.get_running_loop().create_future()
+        self._abi_version = None
+
+        self._send_buffer = bytearray(SEND_BUFFER_SIZE)
+        self._send_size = 0
+        self._flush_handle = None
+        self._dispatching = False
+
+        self._transport = None
+        self._paused = False
+        self._drain_waiter = None
+        self._closed = False
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def get_buffer(self, sizehint):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == BUFFER_SIZE:
+            # Move the partial frame to the front; the length is unchanged so this never resizes
+            size = self._end - self._start
+            self._buffer[:size] = self._view[self._start:self._end]
+            self._start, self._end = 0, size
+
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        self._end += nbytes
+
+        if not self.handshake.done():
+            self._read_handshake()
+            if not self.handshake.done():
+                return
+
+        view = self._view
+        pos = self._start
+        end = self._end
+
+        # Anything written while dispatching (acks, the next queued request) goes out as one write
+        self._dispatching = True
+        try:
+            pos = self._dispatch(view, pos, end)
+        finally:
+            self._dispatching = False
+            self.flush()
+
+        self._start = pos
+
+    def _dispatch(self, view, pos, end):
+        recorder = self.recorder
+
+        while True:
+            available = end - pos
+            if available < 4:
+                # Commands without arguments or data may be sent as a single 0xf0 + cmd byte
+                if available != 1 or view[pos] < SHORT_CMD_BASE:
+                    break
+
+                if recorder is not None:
+                    recorder.record(SERVER, view[pos:pos + 1])
+
+                pos += 1
+                self._start = pos
+                self._frame_received(Command(view[pos - 1] - SHORT_CMD_BASE), (), view[pos:pos])
+                continue
+
+            data_size, arg_len, cmd = HEADER.unpack_from(view, pos)
+            args_end = pos + 4 + arg_len * 4
+            frame_end = args_end + data_size
+            if frame_end > end:
+                break
+
+            if recorder is not None:
+                recorder.record(SERVER, view[pos:frame_end])
+
+            args = _ARGS[arg_len].unpack_from(view, pos + 4)
+            pos = frame_end
+            self._start = pos
+            self._frame_received(Command(cmd), args, view[args_end:frame_end])
+
+        return pos
+
+    def write_frame(self, cmd: Command, args: tuple = (), data: bytes = b''):
+        '''
+        Appends a frame to the send buffer and returns its size. args are (struct format, value)
+        pairs. The buffer is written to the transport once the current batch of received frames
+        has been dispatched, or on the next loop iteration otherwise.
+        '''
+        formats, values = zip(*args) if args else ((), ())
+        encoder, arg_len, cmd_value = get_encoder(cmd, formats)
+
+        start = self._send_size
+        data_start = start + encoder.size
+        end = data_start + len(data)
+
+        buffer = self._send_buffer
+        if end > len(buffer):
+            buffer.extend(bytes(max(end - len(buffer), SEND_BUFFER_SIZE)))
+
+        encoder.pack_into(buffer, start, len(data), arg_len, cmd_value, *values)
+        if data:
+            buffer[data_start:end] = data
+
+        self._send_size = end
+
+        if self.recorder is not None:
+            self.recorder.record(CLIENT, memoryview(buffer)[start:end])
+
+        if not self._dispatching and self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self.flush)
+
+        return end - start
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if self._send_size == 0 or self._closed:
+            return
+
+        size, self._send_size = self._send_size, 0
+        self._transport.write(memoryview(self._send_buffer)[:size])
+
+        # The transport may hold on to whatever it could not send right away
+        if self._transport.get_write_buffer_size() > 0:
+            self._send_buffer = bytearray(SEND_BUFFER_SIZE)
+
+    def write_handshake(self, reply):
+        if self.recorder is not None:
+            self.recorder.record(CLIENT, reply)
+
+        self._transport.write(reply)
+
+    def _read_handshake(self):
+        if self._abi_version is None:
+            if self._end - self._start < self._abi_version_size:
+                return
+
+            self._abi_version = str(self._view[:self._abi_version_size], 'utf-8')
+            self._start = self._abi_version_size
+
+            if self.recorder is not None:
+                self.recorder.record(SERVER, self._view[:self._start])
+
+        marker = self._buffer.find(HANDSHAKE_END, self._start, self._end)
+        end = self._end if marker == -1 else marker + 1
+
+        if self.recorder is not None and end > self._start:
+            self.recorder.record(SERVER, self._view[self._start:end])
+
+        self._start = end
+        if marker != -1:
+            self.handshake.set_result(self._abi_version)
+
+    def connection_lost(self, exc):
+        self._closed = True
+
+        if not self.handshake.done():
+            self.handshake.set_exception(ConnectionResetError('Connection lost during handshake'))
+
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_exception(ConnectionResetError('Connection lost'))
+
+        self._connection_lost(exc)
+
+    def eof_received(self):
+        return False
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+    async def drain(self):
+        self.flush()
+
+        if self._closed:
+            raise ConnectionResetError('Connection lost')
+
+        if not self._paused:
+            return
+
+        self._drain_waiter = asyncio.get_running_loop().create_future()
+        await self._drain_waiter
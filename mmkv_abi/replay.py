@@ -0,0 +1,230 @@
+'''
+Recording and replaying of guiserver sessions so the library can be exercised without makemkvcon,
+a drive or a disc. A replay can be served in-process with ReplayConnector or as a stand-in for
+makemkvcon over stdin/stdout:
+
+    python -m mmkv_abi.replay session.mmkvrec [--speed 1]
+'''
+import argparse
+import asyncio
+from logging import getLogger
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+from .command import Command
+from .protocol import CLIENT, SERVER
+
+MAGIC = b'MMKVREC1'
+RECORD = struct.Struct('<dBI')
+HANDSHAKE_REPLY = b'\xbb'
+
+logger = getLogger(__name__)
+
+
+class Recorder:
+    '''
+    Writes every frame of a session, with the time since the session started and its direction,
+    to a file that ReplayServer can play back
+    '''
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._start = time.monotonic()
+
+    def record(self, direction, data):
+        if self._file.closed:
+            return
+
+        self._file.write(RECORD.pack(time.monotonic() - self._start, direction, len(data)))
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+
+def read_recording(path):
+    '''
+    Returns a list of (time, direction, data) records
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path} is not a session recording')
+
+    records = []
+    pos = len(MAGIC)
+    while pos < len(data):
+        timestamp, direction, size = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        records.append((timestamp, direction, data[pos:pos + size]))
+        pos += size
+
+    return records
+
+
+class ReplayServer:
+    '''
+    Plays the server side of a recording back to a client. speed scales the recorded delays
+    between frames, 1 replays in real time and 0 as fast as possible.
+
+    Requests are matched against the recording by command. CallOnIdle requests that were not
+    recorded are answered with an empty Return and a recorded CallOnIdle the client did not send
+    is skipped (any back-channel messages it carried are still delivered), so the client's idle
+    interval does not need to match the one used while recording.
+    '''
+    RETURN = struct.pack('<HBB', 0, 0, Command.Return.value)
+
+    def __init__(self, records, speed = 0):
+        self.records = records
+        self.speed = speed
+
+    def serve(self, read, write):
+        '''
+        read(n) returns up to n bytes from the client and write(data) sends all of data to it
+        '''
+        self._read = read
+        self._write = write
+        self._held = []
+
+        last_time = 0
+        skip_return = False
+        handshaken = False
+
+        i = 0
+        while i < len(self.records):
+            timestamp, direction, data = self.records[i]
+
+            if direction == SERVER:
+                if self.speed and timestamp > last_time:
+                    time.sleep((timestamp - last_time) / self.speed)
+
+                last_time = timestamp
+                i += 1
+
+                if skip_return and data[3:4] == bytes((Command.Return.value,)):
+                    skip_return = False
+                    continue
+
+                write(data)
+                continue
+
+            last_time = timestamp
+
+            if not handshaken and data == HANDSHAKE_REPLY:
+                if self._read_exact(1) is None:
+                    return
+
+                handshaken = True
+                i += 1
+                continue
+
+            expected = data[3]
+            frame = self._next_frame(expected == Command.ClientDone.value)
+            if frame is None:
+                return
+
+            if frame[3] == expected:
+                i += 1
+            elif frame[3] == Command.CallOnIdle.value:
+                write(self.RETURN)
+            elif expected == Command.CallOnIdle.value:
+                self._held.insert(0, frame)
+                skip_return = True
+                i += 1
+            else:
+                logger.warning(
+                    'Expected %s but received %s', Command(expected).name, Command(frame[3]).name
+                )
+                i += 1
+
+        # The recording is over; keep answering so the client can shut down cleanly
+        while (frame := self._next_frame(False)) is not None:
+            write(self.RETURN)
+
+            if frame[3] == Command.CallSignalExit.value:
+                return
+
+    def _next_frame(self, ack):
+        if not ack and self._held:
+            return self._held.pop(0)
+
+        while True:
+            header = self._read_exact(4)
+            if header is None:
+                return None
+
+            data_size, arg_len, _ = struct.unpack('<HBB', header)
+            body = self._read_exact(arg_len * 4 + data_size)
+            if body is None:
+                return None
+
+            frame = header + body
+            if ack and frame[3] != Command.ClientDone.value:
+                self._held.append(frame)
+                continue
+
+            return frame
+
+    def _read_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._read(size - len(data))
+            if not chunk:
+                return None
+
+            data += chunk
+
+        return data
+
+
+class ReplayConnector:
+    '''
+    Connects MakeMKV to a ReplayServer running on a thread in this process
+    '''
+    def __init__(self, path, speed = 0):
+        self.records = read_recording(path)
+        self.speed = speed
+
+    async def connect(self, protocol_factory):
+        sock, server_sock = socket.socketpair()
+
+        thread = threading.Thread(target=self._serve, args=(server_sock,), daemon=True)
+        thread.start()
+
+        transport, protocol = await asyncio.get_running_loop().connect_accepted_socket(
+            protocol_factory, sock=sock
+        )
+        return transport, protocol, None
+
+    def _serve(self, sock):
+        try:
+            ReplayServer(self.records, self.speed).serve(sock.recv, sock.sendall)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+
+
+def _write_stdout(data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(1, view):]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays a recorded guiserver session over stdin/stdout')
+    parser.add_argument('recording')
+    parser.add_argument('--speed', type=float, default=0, help='1 for real time, 0 for as fast as possible')
+    parser.add_argument('guiserver_args', nargs='*', help='ignored, accepted so this can stand in for makemkvcon')
+    args = parser.parse_args()
+
+    ReplayServer(read_recording(args.recording), args.speed).serve(lambda n: os.read(0, n), _write_stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+class Subscription:
+    '''
+    Async iterator over the events of one subscriber queue, as returned by MakeMKV.events() and
+    friends. The queue is removed from subscribers once iteration ends, on aclose() or
+    unsubscribe(), including when iteration never started.
+    '''
+    def __init__(self, subscribers, queue, iterator):
+        self._subscribers = subscribers
+        self._queue = queue
+        self._iterator = iterator
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._iterator.__anext__()
+        except BaseException:
+            # Whatever ended the iterator, it is finished
+            self.unsubscribe()
+            raise
+
+    def unsubscribe(self):
+        self._subscribers.discard(self._queue)
+
+    async def aclose(self):
+        self.unsubscribe()
+        await self._iterator.aclose()
+
+    def __del__(self):
+        self.unsubscribe()
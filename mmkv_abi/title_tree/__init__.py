@@ -1,4 +1,7 @@
 from .chapter import Chapter
+from .columns import TitleColumns
+from .duplicates import DuplicateGroup, DuplicateReason
+from .selection import Selection
 from .title import Title
 from .title_list import TitleList
 from .track import Track
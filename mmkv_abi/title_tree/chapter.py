@@ -4,6 +4,8 @@ from mmkv_abi.title_tree.tree_node import TreeNode
 
 
 class Chapter(TreeNode):
+    __slots__ = ()
+
     async def get_datetime(self):
         raw = await self.get_info(ItemAttribute.DateTime)
         hours, minutes, seconds = raw.split(':')
@@ -4,12 +4,18 @@ from mmkv_abi.title_tree.tree_node import TreeNode
 
 
 class ChapterList(TreeNode):
-    def __init__(self, makemkv, handle, size):
+    __slots__ = ('_chapters',)
+
+    def __init__(self, makemkv, handle, chapters):
+        '''
+        chapters is either the number of chapters or a list of them to share
+        '''
         super().__init__(makemkv, handle)
-        self._chapters = [None] * size
+        self._chapters = [None] * chapters if isinstance(chapters, int) else chapters
 
     def add_chapter(self, index, handle):
-        self._chapters[index] = Chapter(self._makemkv(), handle)
+        chapter = self._chapters[index] = Chapter(self._makemkv, handle)
+        return chapter
 
     def __getitem__(self, index):
         return self._chapters[index]
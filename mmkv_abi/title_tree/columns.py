@@ -0,0 +1,122 @@
+from mmkv_abi.item_attribute import ItemAttribute
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def parse_duration(raw):
+    '''
+    Converts a Duration such as '1:42:17' to seconds
+    '''
+    hours, minutes, seconds = raw.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+# Attributes with a numeric column type; every other attribute is kept as a string
+COLUMN_TYPES = {
+    ItemAttribute.ChapterCount: int,
+    ItemAttribute.Duration: parse_duration,
+    ItemAttribute.DiskSizeBytes: int,
+    ItemAttribute.SegmentsCount: int,
+    ItemAttribute.OriginalTitleId: int
+}
+
+# Stands in for a missing value in NumPy integer columns
+MISSING = -1
+
+
+def _convert(attribute, values, use_numpy):
+    convert = COLUMN_TYPES.get(attribute)
+    if convert is None:
+        return numpy.array(values, dtype=object) if use_numpy else values
+
+    column = [None if value is None else convert(value) for value in values]
+    if use_numpy:
+        return numpy.array([MISSING if value is None else value for value in column], dtype=numpy.int64)
+
+    return column
+
+
+class TitleColumns:
+    '''
+    Attribute values for a list of titles, one column per ItemAttribute in the same order as
+    titles. Durations are in seconds and counts and sizes are ints. Columns are NumPy arrays when
+    use_numpy is set, with MISSING for values makemkvcon did not report, and lists with None
+    otherwise.
+    '''
+    def __init__(self, titles, raw_columns, use_numpy):
+        self.titles = titles
+        self.use_numpy = use_numpy
+        self._columns = {
+            attribute: _convert(attribute, values, use_numpy) for attribute, values in raw_columns.items()
+        }
+
+    def __getitem__(self, attribute: ItemAttribute):
+        return self._columns[attribute]
+
+    def __contains__(self, attribute):
+        return attribute in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def between(self, attribute: ItemAttribute, low = None, high = None):
+        '''
+        Returns a mask of the titles whose value is within [low, high], either bound may be None.
+        Missing values never match.
+        '''
+        column = self._columns[attribute]
+
+        if self.use_numpy:
+            mask = column != MISSING
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+
+            return mask
+
+        return [
+            value is not None and (low is None or value >= low) and (high is None or value <= high)
+            for value in column
+        ]
+
+    def within(self, ranges):
+        '''
+        Returns a mask of the titles within every {attribute: (low, high)} range
+        '''
+        masks = [self.between(attribute, low, high) for attribute, (low, high) in ranges.items()]
+
+        if self.use_numpy:
+            mask = numpy.ones(len(self.titles), dtype=bool)
+            for other in masks:
+                mask &= other
+
+            return mask
+
+        return [all(selected) for selected in zip(*masks)] if masks else [True] * len(self.titles)
+
+    def select(self, mask, order_by: ItemAttribute = None, top = None):
+        '''
+        Returns the titles selected by mask, in title order or largest first by order_by, keeping
+        at most top of them
+        '''
+        if self.use_numpy:
+            indices = numpy.flatnonzero(mask)
+            if order_by is not None:
+                indices = indices[numpy.argsort(-self._columns[order_by][indices], kind='stable')]
+        else:
+            indices = [i for i, selected in enumerate(mask) if selected]
+            if order_by is not None:
+                column = self._columns[order_by]
+                indices.sort(key=lambda i: -1 if column[i] is None else column[i], reverse=True)
+
+        if top is not None:
+            indices = indices[:top]
+
+        return [self.titles[i] for i in indices]
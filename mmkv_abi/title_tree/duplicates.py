@@ -0,0 +1,157 @@
+from collections import namedtuple
+from enum import IntEnum
+
+from mmkv_abi.item_attribute import ItemAttribute
+
+ATTRIBUTES = (
+    ItemAttribute.SegmentsMap, ItemAttribute.SegmentsCount, ItemAttribute.Duration, ItemAttribute.DiskSizeBytes
+)
+# How much of the longer title's duration a prefix has to play to count as its duplicate
+PREFIX_COVERAGE = 0.9
+
+
+class DuplicateReason(IntEnum):
+    '''
+    How closely the titles of a group match, weakest last
+    '''
+    Identical = 0  # same segments in the same order
+    Reordered = 1  # same segments in a different order
+    Prefix = 2  # the segments of one title start the segments of another and play most of it
+    Metadata = 3  # no segment map; same segment count, duration and size
+
+
+DuplicateGroup = namedtuple('DuplicateGroup', ('representative', 'duplicates', 'reason'))
+DuplicateGroup.__doc__ = '''
+Titles that play the same content. representative is the one to keep, duplicates the others and
+reason the weakest DuplicateReason that joined the group.
+'''
+
+
+def parse_segments_map(raw):
+    '''
+    Converts a SegmentsMap such as '1-3,7,5' to a tuple of segment numbers
+    '''
+    segments = []
+    for part in raw.split(','):
+        part = part.strip()
+        if not part:
+            continue
+
+        first, _, last = part.partition('-')
+        if last:
+            segments.extend(range(int(first), int(last) + 1))
+        else:
+            segments.append(int(first))
+
+    return tuple(segments)
+
+
+class _Groups:
+    '''
+    Union-find over title positions that remembers the weakest reason each group was joined by
+    '''
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.reason = [DuplicateReason.Identical] * size
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+
+        return i
+
+    def union(self, a, b, reason):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[b] = a
+            self.reason[a] = max(self.reason[a], self.reason[b], reason)
+        else:
+            self.reason[a] = max(self.reason[a], reason)
+
+
+def find_duplicates(titles, table, prefixes = True):
+    '''
+    Groups titles by their segment maps from a TitleColumns with ATTRIBUTES and returns a
+    DuplicateGroup for every group of more than one title
+    '''
+    segments_map = table[ItemAttribute.SegmentsMap]
+    count = table[ItemAttribute.SegmentsCount]
+    duration = table[ItemAttribute.Duration]
+    size = table[ItemAttribute.DiskSizeBytes]
+
+    groups = _Groups(len(titles))
+    sequences = [None if raw is None else parse_segments_map(raw) for raw in segments_map]
+
+    def index(keys, reason):
+        seen = {}
+        for i, key in enumerate(keys):
+            if key is None:
+                continue
+
+            first = seen.setdefault(key, i)
+            if first != i:
+                groups.union(first, i, reason)
+
+        return seen
+
+    exact = index(sequences, DuplicateReason.Identical)
+    # Only the first title of each exact sequence, so identical pairs aren't also counted as reordered
+    index(
+        [None if s is None or exact[s] != i else tuple(sorted(s)) for i, s in enumerate(sequences)],
+        DuplicateReason.Reordered
+    )
+
+    metadata = []
+    for i, sequence in enumerate(sequences):
+        key = (count[i], duration[i], size[i])
+        metadata.append(key if sequence is None and None not in key else None)
+
+    index(metadata, DuplicateReason.Metadata)
+
+    def covers(short, long):
+        if duration[short] and duration[long]:
+            return duration[short] >= PREFIX_COVERAGE * duration[long]
+
+        return len(sequences[short]) >= PREFIX_COVERAGE * len(sequences[long])
+
+    if prefixes:
+        # Walk every sequence's proper prefixes by length and look each up among the whole
+        # sequences, keyed by length and last segment first so most lookups miss cheaply
+        ends = {(len(s), s[-1]) for s in exact if s}
+        extended = {}
+        for i, sequence in enumerate(sequences):
+            if not sequence or exact[sequence] != i:
+                continue
+
+            for length in range(1, len(sequence)):
+                if (length, sequence[length - 1]) in ends:
+                    other = exact.get(sequence[:length])
+                    if other is not None and covers(other, i):
+                        extended.setdefault(other, []).append(i)
+
+        # A prefix only joins a title that is not a prefix itself, so matches never chain, and
+        # the shortest of those when several start with it
+        for other, longer in extended.items():
+            longer = [i for i in longer if i not in extended]
+            if longer:
+                groups.union(min(longer, key=lambda i: (len(sequences[i]), i)), other, DuplicateReason.Prefix)
+
+    members = {}
+    for i in range(len(titles)):
+        members.setdefault(groups.find(i), []).append(i)
+
+    def rank(i):
+        # Keep the largest title, then the one with the most segments, then the first
+        return (-(size[i] or 0), -len(sequences[i] or ()), i)
+
+    result = []
+    for root, indices in members.items():
+        if len(indices) < 2:
+            continue
+
+        representative = min(indices, key=rank)
+        duplicates = [titles[i] for i in indices if i != representative]
+        result.append((representative, DuplicateGroup(titles[representative], duplicates, groups.reason[root])))
+
+    return [group for _, group in sorted(result, key=lambda item: item[0])]
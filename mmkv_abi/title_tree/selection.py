@@ -0,0 +1,30 @@
+from mmkv_abi.title_tree.tree_node import TreeNode
+
+
+class Selection:
+    '''
+    Reads and changes the enabled and expanded bits of tree nodes locally. Created by
+    TitleList.batch_selection, which sends the states that changed when the block exits.
+    '''
+    def __init__(self, nodes: [TreeNode]):
+        self.nodes = nodes
+        self._original = {node: node._state for node in nodes}
+
+    def is_enabled(self, node: TreeNode):
+        return node._state & 0x01 == 1
+
+    def is_expanded(self, node: TreeNode):
+        return node._state & 0x02 == 2
+
+    def set_enabled(self, node: TreeNode, value: bool):
+        node._state = (node._state & 0xfffffffe) | int(value)
+
+    def set_expanded(self, node: TreeNode, value: bool):
+        node._state = (node._state & 0xfffffffd) | int(value) << 1
+
+    def changed(self):
+        return [node for node, state in self._original.items() if node._state != state]
+
+    def rollback(self):
+        for node, state in self._original.items():
+            node._state = state
@@ -2,30 +2,56 @@ from datetime import timedelta
 from mmkv_abi.item_attribute import ItemAttribute
 from mmkv_abi.title_tree.chapter import Chapter
 from mmkv_abi.title_tree.chapter_list import ChapterList
+from mmkv_abi.title_tree.columns import parse_duration
 from mmkv_abi.title_tree.track import Track
 from mmkv_abi.title_tree.tree_node import TreeNode
 
 
 class Title(TreeNode):
+    __slots__ = ('_chapter_handle', '_chapters', '_chapter_list', 'tracks', '_missing')
+
     def __init__(self, makemkv, handle: int, chapter_handle: int, chapter_size: int, track_size: int):
         super().__init__(makemkv, handle)
-        self.chapters = ChapterList(makemkv, chapter_handle, chapter_size)
+        self._chapter_handle = chapter_handle
+        self._chapters = [None] * chapter_size
+        self._chapter_list = None
         self.tracks = [None] * track_size
+        self._missing = chapter_size + track_size
+
+    @property
+    def chapters(self):
+        # The ChapterList node is only needed once something looks at it
+        if self._chapter_list is None:
+            self._chapter_list = ChapterList(self._makemkv, self._chapter_handle, self._chapters)
+
+        return self._chapter_list
+
+    @property
+    def complete(self):
+        '''
+        Whether makemkvcon has reported every track and chapter of this title
+        '''
+        return self._missing == 0
 
     def add_track(self, index, handle):
-        self.tracks[index] = Track(self._makemkv(), handle)
+        if self.tracks[index] is None:
+            self._missing -= 1
+
+        track = self.tracks[index] = Track(self._makemkv, handle)
+        return track
 
     def add_chapter(self, index, handle):
-        self.chapters.add_chapter(index, handle)
+        if self._chapters[index] is None:
+            self._missing -= 1
+
+        chapter = self._chapters[index] = Chapter(self._makemkv, handle)
+        return chapter
 
     async def get_chapter_count(self):
         return await self.get_info(ItemAttribute.ChapterCount)
 
     async def get_duration(self):
-        raw = await self.get_info(ItemAttribute.Duration)
-        hours, minutes, seconds = raw.split(':')
-
-        return timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds))
+        return timedelta(seconds=parse_duration(await self.get_info(ItemAttribute.Duration)))
 
     async def get_disc_size(self):
         return await self.get_info(ItemAttribute.DiskSize)
@@ -1,14 +1,28 @@
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from mmkv_abi.item_attribute import ItemAttribute
+from mmkv_abi.priority import Priority
+from mmkv_abi.title_tree import columns
+from mmkv_abi.title_tree.columns import TitleColumns
+from mmkv_abi.title_tree.duplicates import (
+    ATTRIBUTES as DUPLICATE_ATTRIBUTES, DuplicateGroup, find_duplicates
+)
+from mmkv_abi.title_tree.selection import Selection
 from mmkv_abi.title_tree.title import Title
-from mmkv_abi.title_tree.tree_node import TreeNode
+from mmkv_abi.title_tree.tree_node import TreeNode, detached
 
 
 class TitleList(TreeNode):
+    __slots__ = ('_titles',)
+
     def __init__(self, size, makemkv, handle):
         super().__init__(makemkv, handle)
         self._titles: [Title] = [None] * size
 
     def add_title(self, index: int, handle: int, chapter_handle: int, chapter_size: int, track_size: int):
-        self._titles[index] = Title(self._makemkv(), handle, chapter_handle, chapter_size, track_size)
+        title = self._titles[index] = Title(self._makemkv, handle, chapter_handle, chapter_size, track_size)
+        return title
 
     def get_title(self, index: int) -> Title:
         return self._titles[index]
@@ -22,10 +36,178 @@ class TitleList(TreeNode):
     def __iter__(self):
         return iter(self._titles)
 
+    @property
+    def complete(self):
+        '''
+        Whether makemkvcon has reported every title along with all of their tracks and chapters
+        '''
+        return all(title is not None and title.complete for title in self._titles)
+
+    def detach(self):
+        '''
+        Cuts the tree off from its session once its disc is closed, so handles makemkvcon may
+        reuse for the next disc are never looked up. Values that were already fetched can still
+        be read, anything else raises DiscClosed.
+        '''
+        for node in self.nodes():
+            node._makemkv = detached
+
+        for title in self._titles:
+            if title is not None and title._chapter_list is not None:
+                title._chapter_list._makemkv = detached
+
+    def nodes(self, include_chapters = True, include_tracks = True):
+        yield self
+
+        for title in self._titles:
+            if title is None:
+                continue
+
+            yield title
+
+            if include_chapters:
+                yield from (chapter for chapter in title._chapters if chapter is not None)
+
+            if include_tracks:
+                yield from (track for track in title.tracks if track is not None)
+
+    async def prefetch(self, attributes: [ItemAttribute], include_chapters = True, include_tracks = True,
+                       limit = None, priority = Priority.Background):
+        '''
+        Fills the info cache of every node in the tree with the given attributes, sending the
+        requests back-to-back rather than one round-trip at a time. Runs as a background crawl by
+        default, so interactive requests made meanwhile go ahead of it.
+        '''
+        await self._prefetch(self.nodes(include_chapters, include_tracks), attributes, limit, priority)
+
+    async def _prefetch(self, nodes, attributes, limit = None, priority = Priority.Interactive):
+        missing = [
+            (node, item_attribute)
+            for node in nodes
+            for item_attribute in attributes
+            if item_attribute not in node._info_cache
+        ]
+
+        values = await self._makemkv().get_ui_item_infos(
+            [(node._handle, item_attribute) for node, item_attribute in missing], limit, priority
+        )
+
+        for (node, item_attribute), value in zip(missing, values):
+            node._info_cache[item_attribute] = value
+
+    @asynccontextmanager
+    async def batch_selection(self, include_chapters = False, include_tracks = True, limit = None):
+        '''
+        Reads the state of every node in one pipelined burst and yields a Selection to change
+        them locally. The states that changed are sent when the block exits, or discarded if it
+        raises.
+
+            async with titles.batch_selection() as selection:
+                for title in titles:
+                    selection.set_enabled(title, title in wanted)
+        '''
+        makemkv = self._makemkv()
+        nodes = list(self.nodes(include_chapters, include_tracks))
+
+        unknown = [node for node in nodes if node._state is None]
+        states = await makemkv.get_ui_item_states([node._handle for node in unknown], limit)
+        for node, state in zip(unknown, states):
+            node._state = state
+
+        selection = Selection(nodes)
+        try:
+            yield selection
+        except BaseException:
+            selection.rollback()
+            raise
+
+        changed = selection.changed()
+        try:
+            # Raises DiscClosed rather than changing the selection of a disc opened meanwhile
+            await self._makemkv().set_ui_item_states([(node._handle, node._state) for node in changed], limit)
+        except BaseException:
+            # makemkvcon's state is unknown now, read it again next time
+            for node in changed:
+                node._state = None
+            raise
+
+    async def to_columns(self, attributes: [ItemAttribute], use_numpy = None, limit = None) -> TitleColumns:
+        '''
+        Fetches the given attributes of every reported title in bulk and returns them as typed
+        columns. use_numpy defaults to whether NumPy is installed.
+        '''
+        if use_numpy is None:
+            use_numpy = columns.numpy is not None
+        elif use_numpy and columns.numpy is None:
+            raise ImportError('NumPy is not installed')
+
+        titles = [title for title in self._titles if title is not None]
+        await self._prefetch(titles, attributes, limit)
+
+        return TitleColumns(
+            titles,
+            {attribute: [title._info_cache[attribute] for title in titles] for attribute in attributes},
+            use_numpy
+        )
+
+    async def query(self, duration = None, size = None, top = None, use_numpy = None) -> [Title]:
+        '''
+        Returns the titles whose duration, a (min, max) pair of seconds or timedeltas, and size, a
+        (min, max) pair of bytes, are within range; either bound may be None. With top only the
+        top largest titles are returned, largest first. Only the attributes needed are fetched.
+        '''
+        ranges = {}
+        if duration is not None:
+            ranges[ItemAttribute.Duration] = tuple(
+                bound.total_seconds() if isinstance(bound, timedelta) else bound for bound in duration
+            )
+        if size is not None:
+            ranges[ItemAttribute.DiskSizeBytes] = tuple(size)
+
+        order_by = ItemAttribute.DiskSizeBytes if top is not None else None
+        attributes = list(ranges)
+        if order_by is not None and order_by not in ranges:
+            attributes.append(order_by)
+
+        table = await self.to_columns(attributes, use_numpy)
+        return table.select(table.within(ranges), order_by, top)
+
+    async def duplicates(self, prefixes = True) -> [DuplicateGroup]:
+        '''
+        Groups titles that play the same segments, in the same or a different order, or whose
+        segments start another title's and play most of it when prefixes is set. Titles without
+        a segment map are matched on segment count, duration and size instead. Returns a
+        DuplicateGroup for each group of more than one title.
+        '''
+        table = await self.to_columns(DUPLICATE_ATTRIBUTES, use_numpy=False)
+        return find_duplicates(table.titles, table, prefixes)
+
+    async def unique(self, prefixes = False) -> [Title]:
+        '''
+        Returns the titles left after dropping every duplicate but the representative of its group.
+        Titles that only start another one are kept unless prefixes is set.
+        '''
+        skipped = {title for group in await self.duplicates(prefixes) for title in group.duplicates}
+        return [title for title in self._titles if title is not None and title not in skipped]
+
     async def print(self):
         async def selected_sym(node):
             return "✅" if await node.is_enabled() else "❎"
 
+        titles = [title for title in self._titles if title is not None]
+        await self._prefetch(
+            [self, *titles],
+            [ItemAttribute.Name, ItemAttribute.Duration, ItemAttribute.ChapterCount, ItemAttribute.DiskSize]
+        )
+        await self._prefetch(
+            [chapter for title in titles for chapter in title._chapters if chapter is not None],
+            [ItemAttribute.Name, ItemAttribute.DateTime]
+        )
+        await self._prefetch(
+            [track for title in titles for track in title.tracks if track is not None],
+            [ItemAttribute.Type, ItemAttribute.CodecLong]
+        )
+
         print(await self.get_name())
 
         for i, title in enumerate(self._titles):
@@ -3,6 +3,8 @@ from mmkv_abi.title_tree.tree_node import TreeNode
 
 
 class Track(TreeNode):
+    __slots__ = ()
+
     async def get_codec_long(self):
         return await self.get_info(ItemAttribute.CodecLong)
 
@@ -1,19 +1,43 @@
 import weakref
 
+from mmkv_abi.exception import DiscClosed
 from mmkv_abi.item_attribute import ItemAttribute
 
+
+def detached():
+    '''
+    Stands in for the session reference of nodes whose disc has been closed
+    '''
+    raise DiscClosed()
+
+
 class TreeNode:
+    # Discs with hundreds of playlists have tens of thousands of nodes, so they are kept small:
+    # no __dict__, one weakref shared by the whole tree and no info cache until it is used
+    __slots__ = ('_makemkv', '_handle', '_info', '_state')
+
     def __init__(self, makemkv, handle: int):
-        self._makemkv = weakref.ref(makemkv)
+        if type(makemkv) is not weakref.ref and makemkv is not detached:
+            makemkv = weakref.ref(makemkv)
+
+        self._makemkv = makemkv
         self._handle = handle
-        self._info_cache = {}
+        self._info = None
         self._state: int = None
 
+    @property
+    def _info_cache(self):
+        if self._info is None:
+            self._info = {}
+
+        return self._info
+
     async def get_info(self, item_attribute: ItemAttribute):
-        if item_attribute not in self._info_cache:
-            self._info_cache[item_attribute] = await self._makemkv().get_ui_item_info(self._handle, item_attribute)
+        info_cache = self._info_cache
+        if item_attribute not in info_cache:
+            info_cache[item_attribute] = await self._makemkv().get_ui_item_info(self._handle, item_attribute)
         
-        return self._info_cache[item_attribute]
+        return info_cache[item_attribute]
 
     async def get_name(self):
         return await self.get_info(ItemAttribute.Name)
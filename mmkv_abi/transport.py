@@ -0,0 +1,29 @@
+import asyncio
+import socket
+from subprocess import STDOUT
+
+
+class ProcessConnector:
+    '''
+    Runs a guiserver process with its stdin and stdout on one end of a socketpair. Sockets rather
+    than pipes are used so frames can be received straight into the protocol's buffer.
+    '''
+    def __init__(self, args):
+        self.args = args
+
+    async def connect(self, protocol_factory):
+        '''
+        Returns (transport, protocol, process)
+        '''
+        sock, child_sock = socket.socketpair()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.args, stdout=child_sock, stderr=STDOUT, stdin=child_sock
+            )
+        finally:
+            child_sock.close()
+
+        transport, protocol = await asyncio.get_running_loop().connect_accepted_socket(
+            protocol_factory, sock=sock
+        )
+        return transport, protocol, process
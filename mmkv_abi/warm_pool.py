@@ -0,0 +1,190 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from logging import getLogger
+
+from .exception import CommunicationError
+from .mmkv import IDLE_INTERVAL, MakeMKV, TIMEOUT
+
+
+class WarmPool:
+    '''
+    Keeps size sessions spawned, handshaken and with their language data loaded so a job can take
+    one without waiting on makemkvcon to start. Taken sessions are replaced in the background,
+    idle ones are health checked with CallOnIdle and a session is retired after max_jobs jobs.
+    Only taken sessions send CallOnIdle every idle_interval, and a returned session is retired
+    when size sessions are already idle.
+    '''
+    def __init__(self, size = 2, max_jobs = None, health_check_interval = 30, logger = None,
+                 session_factory = MakeMKV, idle_interval = IDLE_INTERVAL):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.health_check_interval = health_check_interval
+        self.idle_interval = idle_interval
+
+        if logger is None:
+            logger = getLogger(__name__)
+
+        self.logger = logger
+
+        self._session_factory = session_factory
+        self._idle = deque()
+        self._waiters = deque()
+        self._job_counts = {}
+        self._spawning = 0
+        self._tasks = set()
+        self._health_check = None
+        self._closed = False
+
+    async def start(self):
+        self._fill()
+        if self.health_check_interval:
+            self._health_check = asyncio.create_task(self._health_check_loop())
+
+    async def close(self):
+        self._closed = True
+
+        if self._health_check is not None:
+            self._health_check.cancel()
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(CommunicationError())
+
+        while self._idle:
+            await self._retire(self._idle.popleft())
+
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError('Pool is closed')
+
+        if self._idle:
+            session = self._idle.popleft()
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._fill()
+
+            try:
+                session = await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._put(waiter.result())
+                raise
+
+        session.set_idle_interval(self.idle_interval)
+        self._fill()
+        return session
+
+    async def release(self, session, discard = False):
+        '''
+        Returns a session to the pool, closing its disc if one is still open. Pass discard to
+        close the session instead.
+        '''
+        count = self._job_counts.get(session, 0) + 1
+        self._job_counts[session] = count
+
+        if not discard and session.disc is not None:
+            try:
+                await session.close_disc()
+            except Exception:
+                self.logger.exception('Failed to close the disc of a session')
+                discard = True
+
+        if discard or self._closed or (self.max_jobs is not None and count >= self.max_jobs):
+            await self._retire(session)
+            self._fill()
+            return
+
+        if len(self._idle) >= self.size and not any(not waiter.done() for waiter in self._waiters):
+            # Sessions spawned while it was taken already refilled the pool
+            await self._retire(session)
+            return
+
+        session.set_idle_interval(None)
+        self._put(session)
+
+    @asynccontextmanager
+    async def session(self):
+        session = await self.acquire()
+        try:
+            yield session
+        except BaseException:
+            await self.release(session, discard=True)
+            raise
+        else:
+            await self.release(session)
+
+    def _put(self, session):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(session)
+                return
+
+        self._idle.append(session)
+
+    def _fill(self):
+        if self._closed:
+            return
+
+        missing = self.size + len(self._waiters) - len(self._idle) - self._spawning
+        for _ in range(max(0, missing)):
+            self._spawning += 1
+            task = asyncio.create_task(self._spawn())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _spawn(self):
+        try:
+            # The health check pings idle sessions, acquire starts the session's own pinging
+            session = self._session_factory(self.logger, idle_interval=None)
+            await session.init()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.exception('Failed to start a session')
+
+            # Don't leave a job waiting on a session that is never coming
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_exception(e)
+                    break
+
+            return
+        finally:
+            self._spawning -= 1
+
+        if self._closed:
+            await session.close()
+            return
+
+        self._job_counts[session] = 0
+        self._put(session)
+
+    async def _retire(self, session):
+        self._job_counts.pop(session, None)
+        try:
+            await session.close()
+        except Exception:
+            self.logger.exception('Failed to close a session')
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+
+            for session in list(self._idle):
+                try:
+                    await asyncio.wait_for(session.idle(), TIMEOUT)
+                except (CommunicationError, asyncio.exceptions.TimeoutError):
+                    if session in self._idle:
+                        self._idle.remove(session)
+                        await self._retire(session)
+
+            self._fill()